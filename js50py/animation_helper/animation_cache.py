@@ -0,0 +1,101 @@
+import atexit
+from collections import Counter, OrderedDict
+import json
+import os
+from pathlib import Path
+from threading import Lock
+
+
+class AnimationCache:
+    """Byte bounded LRU of loaded animations keyed by (cache path, mtime).
+
+    Memory mapped frames are kept as they are, pages come in from the page
+    cache while they are played and the kernel can drop them again, so
+    ``max_bytes`` bounds the mapped size rather than resident memory. Every request is counted per path so the most used
+    animations can be prewarmed after a restart. The counts are written
+    every ``save_every`` requests, after a prewarm and at exit, an
+    unreadable usage file starts the counts over.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, usage_file=None, save_every=16):
+        self.max_bytes = max_bytes
+        self.usage_file = usage_file
+        self.save_every = save_every
+        self.unsaved = 0
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = Lock()
+        self.save_lock = Lock()
+        self.usage = Counter()
+        if usage_file is not None:
+            if usage_file.is_file():
+                try:
+                    self.usage = Counter(json.loads(usage_file.read_text()))
+                except (OSError, ValueError) as e:
+                    print(f'Ignoring unreadable usage file {usage_file}: {e}')
+            atexit.register(self.save_usage)
+
+    def get(self, path, loader, count=True):
+        try:
+            key = (str(path), path.stat().st_mtime_ns)
+        except FileNotFoundError:
+            return loader(path)
+        with self.lock:
+            if count:
+                self.usage[str(path)] += 1
+                self.unsaved += 1
+                save = self.unsaved >= self.save_every
+            animation = self.entries.get(key)
+            if animation is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if count and save:
+            self.save_usage()
+        if animation is None:
+            animation = loader(path)
+            self.put(key, animation)
+        return animation
+
+    def put(self, key, animation):
+        nbytes = animation['frames'].nbytes
+        if nbytes > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            for old_key in [k for k in self.entries if k[0] == key[0]]:
+                self.size -= self.entries.pop(old_key)['frames'].nbytes
+            while self.entries and self.size + nbytes > self.max_bytes:
+                self.size -= self.entries.popitem(last=False)[1]['frames'].nbytes
+                self.evictions += 1
+            self.entries[key] = animation
+            self.size += nbytes
+
+    def prewarm(self, loader, paths=(), most_used=8):
+        with self.lock:
+            paths = list(paths) + [Path(p) for p, _ in self.usage.most_common(most_used)]
+        for path in paths:
+            if path.is_file():
+                self.get(path, loader, count=False)
+        self.save_usage()
+
+    def save_usage(self):
+        if self.usage_file is None:
+            return
+        with self.lock:
+            usage = json.dumps(self.usage)
+            self.unsaved = 0
+        # Replaced in one step, a power cut never leaves a truncated file behind
+        temp_file = self.usage_file.with_name(f'{self.usage_file.name}.{os.getpid()}.tmp')
+        with self.save_lock:
+            temp_file.write_text(usage)
+            temp_file.replace(self.usage_file)
+
+    def stats(self):
+        return dict(entries=len(self.entries), bytes=self.size, max_bytes=self.max_bytes,
+                    hits=self.hits, misses=self.misses, evictions=self.evictions)
@@ -1,10 +1,13 @@
+import json
 import os
 import shutil
 import subprocess
 from datetime import datetime, timedelta
+from functools import lru_cache
+from queue import Full, Queue
+from threading import Event, Thread
 import time
 import emoji
-import freetype
 import numpy as np
 import pytz
 import qrcode
@@ -12,6 +15,9 @@ import skvideo.io
 from PIL import Image, ImageOps
 
 import config
+from animation_helper.compositor import FrameCompositor
+from animation_helper.glyph_atlas import glyph_atlas
+from animation_helper.palette import tint
 
 tz = pytz.timezone(config.time_zone)
 tgs_tool = str((config.base_dir / 'tools' / 'tgs' / 'cli.js').absolute())
@@ -40,17 +46,134 @@ def cache_animation(sticker, cache_file):
     for n, frame in enumerate(frame_list):
         all_frames[n] = frame
 
-    np.savez_compressed(cache_file, frames=all_frames)
+    save_frames(cache_file, all_frames)
     shutil.rmtree(temp_folder)
     sticker.unlink()
 
 
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def discard_download(meta_data):
+    """Removes the raw download (.tgs sticker or video) of a command that was dropped unloaded."""
+    if meta_data.get('raw'):
+        remove_file(meta_data['raw'])
+
+
+def save_frames(cache_file, frames):
+    # Written under a temporary name first, so a reader never maps a half written file
+    temp_file = cache_file.with_name(f'{cache_file.name}.{os.getpid()}.tmp')
+    with open(temp_file, 'wb') as f:
+        np.save(f, np.ascontiguousarray(frames, dtype=np.uint8))
+    temp_file.replace(cache_file)
+
+
+def load_frames(cache_file):
+    return np.load(cache_file, mmap_mode='r')
+
+
+def migrate_frame_cache(legacy_file):
+    cache_file = legacy_file.with_suffix('.npy')
+    if not cache_file.is_file():
+        save_frames(cache_file, np.load(legacy_file)['frames'])
+    legacy_file.unlink()
+    return cache_file
+
+
+def frame_cache_file(animation_file):
+    cache_file = animation_file.with_suffix('.npy')
+    legacy_file = animation_file.with_suffix('.npz')
+    if not cache_file.is_file() and legacy_file.is_file():
+        migrate_frame_cache(legacy_file)
+    return cache_file
+
+
+class VideoStream:
+    """Decodes a video on a background thread while it is played.
+
+    Every iteration starts a decoder pass that fills a small ring buffer, so
+    the first frames show up right away. A clip that fits into ``max_bytes``
+    is kept after the first full pass and later loops play from memory,
+    longer clips re-open the stream for every loop.
+    """
+
+    def __init__(self, video_file, buffer_frames=16, max_bytes=32 * 1024 * 1024):
+        self.video_file = video_file
+        self.buffer_frames = buffer_frames
+        self.max_bytes = max_bytes
+        self.frames = None
+
+    @staticmethod
+    def _put(ring, item, stop):
+        while not stop.is_set():
+            try:
+                ring.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _decode(self, ring, stop):
+        reader = None
+        try:
+            reader = skvideo.io.FFmpegReader(str(self.video_file))
+            for frame in reader.nextFrame():
+                if not self._put(ring, frame, stop):
+                    break
+        except Exception as e:
+            print(f'video decoding failed: {e}')
+        finally:
+            if reader is not None:
+                reader.close()
+            self._put(ring, None, stop)
+
+    def _stream(self):
+        ring = Queue(maxsize=self.buffer_frames)
+        stop = Event()
+        Thread(target=self._decode, args=(ring, stop), daemon=True).start()
+        kept, kept_bytes = [], 0
+        try:
+            while True:
+                frame = ring.get()
+                if frame is None:
+                    break
+                if kept is not None:
+                    kept_bytes += frame.nbytes
+                    if kept_bytes > self.max_bytes:
+                        kept = None
+                    else:
+                        kept.append(frame)
+                yield frame
+            if kept:
+                self.frames = np.stack(kept)
+            elif kept is not None:
+                # Nothing could be decoded, do not spin on re-opening the file
+                time.sleep(1)
+        finally:
+            stop.set()
+
+    def __iter__(self):
+        if self.frames is not None:
+            return iter(self.frames)
+        return self._stream()
+
+
 def load_video(video_cache_file):
+    if video_cache_file.suffix in ('.rgb', '.npy'):
+        header = json.loads(video_cache_file.with_suffix('.json').read_text())
+        if video_cache_file.suffix == '.rgb':
+            size = header['size']
+            frames = np.memmap(video_cache_file, dtype=np.uint8, mode='r', shape=(header['frames'], size, size, 3))
+        else:
+            frames = load_frames(video_cache_file)
+        return {'animation': True, 'frames': frames, 'fps': header['fps']}
     metadata = skvideo.io.ffprobe(video_cache_file)['video']
     fps = int(round(float(metadata["@nb_frames"])/float(metadata['@duration'])))
-    the_video = skvideo.io.vread(str(video_cache_file))
-    return {'animation': True, 'frames': the_video, 'fps': fps}
-
+    return {'animation': True, 'frames': VideoStream(video_cache_file), 'fps': fps}
 
 def load_photo(photo_cache_file, size=64, box=True, fill_color=(0,0,0,0)):
     pil_image = Image.open(photo_cache_file)
@@ -62,26 +185,54 @@ def load_photo(photo_cache_file, size=64, box=True, fill_color=(0,0,0,0)):
     return np.array(pil_image.convert('RGB'), dtype=np.uint8)[None, ...]
 
 
-def prepare_video(video_cache_file_raw, video_cache_file):
-    subprocess.run(['ffmpeg', '-i', str(video_cache_file_raw.absolute()), '-vf', 'scale=64:64:force_original_aspect_ratio=decrease,pad=64:64:-1:-1:color=black',
-                    '-c:v', 'libx264',  '-crf', '0', '-an', '-y',
-                    str(video_cache_file.absolute())],
-                   check=True, stdout=open(os.devnull, 'wb'), stderr=open(os.devnull, 'wb'))
-    video_cache_file_raw.unlink()
-
+def probe_fps(video_file, default=30):
+    result = subprocess.run(['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+                             '-show_entries', 'stream=avg_frame_rate,r_frame_rate', '-of', 'json',
+                             str(video_file.absolute())], check=True, capture_output=True)
+    streams = json.loads(result.stdout).get('streams') or [{}]
+    for key in ['avg_frame_rate', 'r_frame_rate']:
+        num, _, den = streams[0].get(key, '0/0').partition('/')
+        if float(num) > 0 and float(den or 1) > 0:
+            return int(round(float(num) / float(den or 1)))
+    return default
+
+
+def prepare_video(video_cache_file_raw, video_cache_file, size=64):
+    """Scales a video straight to rgb24 frames in ``video_cache_file`` (.rgb).
+
+    ffmpeg writes the frames once, the .json sidecar holds fps and shape so
+    playback maps the file directly and needs no decoder. Both appear only
+    once complete, nothing is left behind when ffmpeg fails.
+    """
+    temp_frames = video_cache_file.with_name(f'{video_cache_file.name}.{os.getpid()}.tmp')
+    header_file = video_cache_file.with_suffix('.json')
+    temp_header = header_file.with_name(f'{header_file.name}.{os.getpid()}.tmp')
+    try:
+        fps = probe_fps(video_cache_file_raw)
+        subprocess.run(['ffmpeg', '-i', str(video_cache_file_raw.absolute()), '-vf', f'scale={size}:{size}:force_original_aspect_ratio=decrease,pad={size}:{size}:-1:-1:color=black',
+                        '-an', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-y',
+                        str(temp_frames.absolute())],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        frames = temp_frames.stat().st_size // (size * size * 3)
+        if frames == 0:
+            raise ValueError(f'no frames decoded from {video_cache_file_raw}')
+        temp_header.write_text(json.dumps({'fps': fps, 'frames': frames, 'size': size}))
+        temp_header.replace(header_file)
+        temp_frames.replace(video_cache_file)
+    finally:
+        for temp_file in [temp_frames, temp_header, video_cache_file_raw]:
+            if temp_file.is_file():
+                temp_file.unlink()
 
 def load_animation(animation_file):
-    cache_file = animation_file.with_suffix('.npz')
-    if cache_file.is_file():
-        frames = np.load(cache_file)['frames']
-    else:
+    cache_file = frame_cache_file(animation_file)
+    if not cache_file.is_file():
         cache_animation(animation_file, cache_file)
-        frames = np.load(cache_file)['frames']
-    return {'animation': True, 'frames': frames, 'fps': 60}
+    return {'animation': True, 'frames': load_frames(cache_file), 'fps': 60}
 
 
 def prepare_animation(animation_file):
-    cache_file = animation_file.with_suffix('.npz')
+    cache_file = frame_cache_file(animation_file)
     if not cache_file.is_file():
          cache_animation(animation_file, cache_file)
 
@@ -112,89 +263,67 @@ def load_qr(data, rgb=(255, 255, 255), size=64):
     return {'mover': True, 'frame': full, 'fps': 5}
 
 
-def get_stop_watch(diff, rgb=(1, 1, 1), display_shape=(64, 64)):
-    font_size = 26
-    buffer_frame = np.zeros((display_shape[0], display_shape[1], 3), dtype=np.uint8)
-    hour = text2numpy(f'{int(diff / (60 * 60)):02d}', mono=True, include_emoji=False, face_size=font_size, rgb=rgb)
-    minute = text2numpy(f'{int((diff / 60) % 60):02d}', mono=True, include_emoji=False, face_size=font_size, rgb=rgb)
-    second = text2numpy(f'{int(diff % 60):02d}', mono=True, include_emoji=False, face_size=font_size, rgb=rgb)
-    millisecond = text2numpy(f'{int(diff % 1 * 100):02d}', mono=True, include_emoji=False, face_size=font_size, rgb=rgb)
-    height, width = hour.shape[:2]
+def get_stop_watch(diff, rgb=(1, 1, 1), display_shape=(64, 64), compositor=None):
+    if compositor is None:
+        compositor = FrameCompositor(display_shape)
+    digits = digit_sprite_sheet(26)
+    height, width = digits.height, digits.width
+    values = [int(diff / (60 * 60)) % 100, int((diff / 60) % 60), int(diff % 60), int(diff % 1 * 100)]
 
-    display_data = [[hour, minute], [second, millisecond]]
     x_starts = [(display_shape[0] - height*2)//3, display_shape[0] - (display_shape[0] - height*2)//3-height]
-    for x in [0, 1]:
-        for y in [0, 1]:
-            x_start = x_starts[x]
-            y_start = y * (display_shape[1] - width + 3)
-            bs = np.index_exp[x_start:x_start + height, y_start:y_start + width - 3]
-            buffer_frame[bs][display_data[x][y][:, :-3] != 0] = display_data[x][y][:, :-3][
-                display_data[x][y][:, :-3] != 0]
+    for n, value in enumerate(values):
+        x, y = divmod(n, 2)
+        position = (x_starts[x], y * (display_shape[1] - width + 3))
+        compositor.update(f'quad_{n}', position, (value, rgb),
+                          lambda: digits.tint(value, rgb=rgb)[:, :-3], transparent=True)
 
-    return buffer_frame
+    return compositor.compose()
 
 
-def get_time_quad(earth=None, earth_frame=0, rgb=(1, 1, 1), display_shape=(64, 64)):
+def get_time_quad(earth=None, earth_frame=0, rgb=(1, 1, 1), display_shape=(64, 64), compositor=None):
+    if compositor is None:
+        compositor = FrameCompositor(display_shape)
     now = datetime.now(tz)
-    day = text2numpy(f'{now.day:02d}', mono=True, include_emoji=False, face_size=18, rgb=rgb)
-    month = text2numpy(f'{now.month:02d}', mono=True, include_emoji=False, face_size=18, rgb=rgb)
-    hour = text2numpy(f'{now.hour:02d}', mono=True, include_emoji=False, face_size=18, rgb=rgb)
-    minute = text2numpy(f'{now.minute:02d}', mono=True, include_emoji=False, face_size=18, rgb=rgb)
-    # second = text2numpy(f'{now.second:02d}', mono=True, include_emoji=False, face_size=18, rgb=rgb)
-    # millisecond = text2numpy(f'{int(now.microsecond/3E4)*3:02d}', mono=True, include_emoji=False, face_size=18, rgb=rgb)
-    height, width = hour.shape[:2]
-    buffer_frame = np.zeros((display_shape[0], display_shape[1], 3), dtype=np.uint8)
+    digits = digit_sprite_sheet(18)
+    height, width = digits.height, digits.width
     if earth is not None:
-        x_start = (display_shape[0] - earth.shape[1])//2
-        y_start = (display_shape[1] - earth.shape[2])//2
-        bs = np.index_exp[x_start:x_start+earth.shape[1], y_start:y_start+earth.shape[2]]
-        buffer_frame[bs] = earth[earth_frame]
-
-    display_data = [[day, month], [hour, minute]]
-    for x in [0, 1]:
-        for y in [0, 1]:
-            x_start = x * (display_shape[0] - height)
-            y_start = y * (display_shape[1] - width + 3)
-            bs = np.index_exp[x_start:x_start+height, y_start:y_start+width-3]
-            buffer_frame[bs][display_data[x][y][:, :-3] != 0] = display_data[x][y][:, :-3][display_data[x][y][:, :-3] != 0]
+        position = ((display_shape[0] - earth.shape[1])//2, (display_shape[1] - earth.shape[2])//2)
+        key = earth.frame_key(earth_frame) if hasattr(earth, 'frame_key') else (id(earth), earth_frame)
+        compositor.update('earth', position, key, lambda: earth[earth_frame])
 
-    return buffer_frame
+    for n, value in enumerate([now.day, now.month, now.hour, now.minute]):
+        x, y = divmod(n, 2)
+        position = (x * (display_shape[0] - height), y * (display_shape[1] - width + 3))
+        compositor.update(f'quad_{n}', position, (value, rgb),
+                          lambda: digits.tint(value, rgb=rgb)[:, :-3], transparent=True)
 
+    return compositor.compose()
 
-def get_weather_clock(icon, temp, rgb=(1, 1, 1), display_shape=(64, 64)):
+
+def get_weather_clock(icon, temp, rgb=(1, 1, 1), display_shape=(64, 64), compositor=None):
+    if compositor is None:
+        compositor = FrameCompositor(display_shape)
     now = datetime.now(tz)
+    digits = digit_sprite_sheet(18)
+
+    position = ((display_shape[0] - icon.shape[0])//2 - 4, (display_shape[1] - icon.shape[1])//2)
+    compositor.update('icon', position, (id(icon), rgb),
+                      lambda: tint(icon, rgb))
+
+    for y, value in enumerate([now.hour, now.minute]):
+        position = (0, y * (display_shape[1] - digits.width))
+        compositor.update(f'time_{y}', position, value, lambda: digits.tint(value))
+
     temp = temp.split('.')
-    temp_full = text2numpy(temp[0], mono=True, include_emoji=False, face_size=18, rgb=(1, 1, 1))
-    temp_rest = text2numpy(temp[1], mono=True, include_emoji=False, face_size=18, rgb=(1, 1, 1))
-    hour = text2numpy(f'{now.hour:02d}', mono=True, include_emoji=False, face_size=18, rgb=(1, 1, 1))
-    minute = text2numpy(f'{now.minute:02d}', mono=True, include_emoji=False, face_size=18, rgb=(1, 1, 1))
+    for y, text in enumerate([temp[1], temp[0]]):
+        temp_text = mono_text(text, 18)
+        height, width = temp_text.shape[:2]
+        position = (display_shape[0] - height, (display_shape[1])//2 - (y * width) - (y*4) + 2)
+        compositor.update(f'temp_{y}', position, text, lambda: temp_text)
 
-    buffer_frame = np.zeros((display_shape[0], display_shape[1], 3), dtype=np.uint8)
-    icon = np.stack([icon * c for c in rgb], axis=-1)
-
-    x_start = (display_shape[0] - icon.shape[0])//2 - 4
-    y_start = (display_shape[1] - icon.shape[1])//2
-    bs = np.index_exp[x_start:x_start+icon.shape[0], y_start:y_start+icon.shape[1]]
-    buffer_frame[bs] = icon
-
-    display_data = [hour, minute]
-    for y in [0, 1]:
-        height, width = display_data[y].shape[:2]
-        y_start = y * (display_shape[1] - width)
-        bs = np.index_exp[:height, y_start:y_start+width]
-        buffer_frame[bs] = display_data[y]
-    display_data = [temp_rest, temp_full]
-    for y in [0, 1]:
-        height, width = display_data[y].shape[:2]
-        y_start = (display_shape[1])//2 - (y * width) - (y*4) + 2
-        bs = np.index_exp[display_shape[0]-height:, y_start:y_start+width]
-        buffer_frame[bs] = display_data[y]
-    # height, width = temp.shape[:2]
-    # y_start = (display_shape[1] - temp.shape[1]) // 2
-    # bs = np.index_exp[display_shape[0] - height:display_shape[0], y_start:y_start + width - 3]
-    # buffer_frame[bs] = temp[:, :-3]
-    buffer_frame[-2:, display_shape[1]//2-2: display_shape[1]//2, :] = 255
-    return buffer_frame
+    compositor.update('point', (display_shape[0] - 2, display_shape[1]//2 - 2), True,
+                      lambda: np.full((2, 2, 3), 255, dtype=np.uint8))
+    return compositor.compose()
 
 
 def get_time(display_seconds=True, rgb=(1, 1, 1), display_shape=(64, 64)):
@@ -218,91 +347,91 @@ def get_time(display_seconds=True, rgb=(1, 1, 1), display_shape=(64, 64)):
 
 
 def emoji2numpy(text):
-    face_size = config.settings['emoji']['size']
-    emoji_face = freetype.Face(str((config.fonts_folder / config.settings['emoji']['font']).absolute()))
-    emoji_face.set_char_size(face_size * 64)
-    emoji_face.load_char(text[0], freetype.FT_LOAD_COLOR)
-    slot = emoji_face.glyph
-    w, h = slot.bitmap.width, slot.bitmap.rows
-    Z = np.array(slot.bitmap.buffer, dtype=np.uint8).reshape(h, w, 4)
-    return convert_bgra_to_rgb(Z)
+    glyph = glyph_atlas.glyph(config.settings['emoji']['font'], config.settings['emoji']['size'], text[0], color=True)
+    return convert_bgra_to_rgb(glyph.bitmap)
 
 
 def text2numpy(text, mono=False, include_emoji=True, face_size=20, rgb=(1, 1, 1)):
     if include_emoji:
         face_size = config.settings['emoji']['size']
-    if include_emoji:
-        emoji_face = freetype.Face(str((config.fonts_folder / config.settings['emoji']['font']).absolute()))
-        emoji_face.set_char_size(face_size * 64)
+        emoji_font = config.settings['emoji']['font']
 
     if mono:
-        base_face = freetype.Face(str((config.fonts_folder / 'CourierPrime-Regular.ttf').absolute()))
+        base_font = 'CourierPrime-Regular.ttf'
     else:
-        base_face = freetype.Face(str((config.fonts_folder / 'OpenSans-SemiBold.ttf').absolute()))
+        base_font = 'OpenSans-SemiBold.ttf'
 
-    base_face.set_char_size(face_size * 64)
-    is_emoji = np.zeros(len(text), dtype=np.bool)
-    for i, c in enumerate(text):
-        is_emoji[i] = c in emoji.UNICODE_EMOJI
-    # First pass to compute bbox
+    # First pass to compute bbox from the cached glyph metrics
     width, height, baseline = 0, 0, 0
     previous = 0
-    for i, c in enumerate(text):
-        if is_emoji[i] and include_emoji:
-            face = emoji_face
-        elif is_emoji[i]:
+    layout = []
+    for c in text:
+        is_emoji = c in emoji.UNICODE_EMOJI
+        if is_emoji and include_emoji:
+            font = emoji_font
+        elif is_emoji:
             continue
         else:
-            face = base_face
-        face.load_char(c)
-        slot = face.glyph
-        bitmap = slot.bitmap
-        height = max(height,
-                     bitmap.rows + max(0, -(slot.bitmap_top - bitmap.rows)))
-        baseline = max(baseline, max(0, -(slot.bitmap_top - bitmap.rows)))
-        kerning = face.get_kerning(previous, c)
-        w, h = bitmap.width, bitmap.rows
-        # print(f'{slot.advance.x} {slot.advance.x >> 6} | {kerning.x} {kerning.x >> 6} | {w},{h}')
-        # width += bitmap.width + (kerning.x >> 6)
-        width += max(slot.advance.x >> 6, w) + (kerning.x >> 6)
+            font = base_font
+        glyph = glyph_atlas.glyph(font, face_size, c, color=is_emoji)
+        h, w = glyph.bitmap.shape[:2]
+        height = max(height, h + max(0, -(glyph.top - h)))
+        baseline = max(baseline, max(0, -(glyph.top - h)))
+        kerning = glyph_atlas.kerning(font, face_size, previous, c)
+        width += max(glyph.advance, w) + kerning
+        layout.append((glyph, kerning, is_emoji))
         previous = c
 
     Z = np.zeros((height, width, 4), dtype=np.uint8)
 
-    # print(f'original size (h,w) {height}, {width}')
-    # Second pass for actual rendering
-    x, y = 0, 0
-    previous = 0
-    for i, c in enumerate(text):
-        if is_emoji[i] and include_emoji:
-            face = emoji_face
-            face.load_char(c, freetype.FT_LOAD_COLOR)
-        elif is_emoji[i]:
-            continue
-        else:
-            face = base_face
-            face.load_char(c)
-        slot = face.glyph
-        bitmap = slot.bitmap
-        top = slot.bitmap_top
-        w, h = bitmap.width, bitmap.rows
-        y = max(0, height - baseline - top)
-        kerning = face.get_kerning(previous, c)
-        x += (kerning.x >> 6)
-        # print(f'{kerning.x << 6} {kerning.x} | {x} | {w}, {h}')
-        if c in emoji.UNICODE_EMOJI:
-            Z[y:y + h, x:x + w] += np.array(bitmap.buffer, dtype=np.uint8).reshape(h, w, 4)
+    # Second pass blits the atlas bitmaps
+    x = 0
+    for glyph, kerning, is_emoji in layout:
+        h, w = glyph.bitmap.shape[:2]
+        y = max(0, height - baseline - glyph.top)
+        x += kerning
+        if is_emoji:
+            Z[y:y + h, x:x + w] += glyph.bitmap
         else:
-            binary_mask = np.array(bitmap.buffer, dtype='ubyte').reshape(h, w)
-            Z[y:y + h, x:x + w, 0] = binary_mask * rgb[2]
-            Z[y:y + h, x:x + w, 1] = binary_mask * rgb[1]
-            Z[y:y + h, x:x + w, 2] = binary_mask * rgb[0]
-            Z[y:y + h, x:x + w, 3] = binary_mask
-        x += (slot.advance.x >> 6)
-        previous = c
+            Z[y:y + h, x:x + w, :3] = tint(glyph.bitmap, rgb[::-1])
+            Z[y:y + h, x:x + w, 3] = glyph.bitmap
+        x += glyph.advance
     return convert_bgra_to_rgb(Z)
 
 
+class DigitSpriteSheet:
+    """All two digit strings 00-99 rendered once into a single mask array.
+
+    Cells share one (height, width), bottom aligned on the baseline, so the
+    clock faces can index and tint them without touching freetype.
+    """
+
+    def __init__(self, face_size, mono=True):
+        digits = [text2numpy(f'{n:02d}', mono=mono, include_emoji=False, face_size=face_size)[:, :, 0]
+                  for n in range(100)]
+        self.height = max(d.shape[0] for d in digits)
+        self.width = max(d.shape[1] for d in digits)
+        self.sheet = np.zeros((100, self.height, self.width), dtype=np.uint8)
+        for n, d in enumerate(digits):
+            self.sheet[n, self.height - d.shape[0]:, :d.shape[1]] = d
+        self.sheet.setflags(write=False)
+
+    def tint(self, values, rgb=(1, 1, 1)):
+        return tint(self.sheet[values], rgb)
+
+
+@lru_cache(maxsize=32)
+def mono_text(text, face_size):
+    text_frame = text2numpy(text, mono=True, include_emoji=False, face_size=face_size, rgb=(1, 1, 1))
+    text_frame.setflags(write=False)
+    return text_frame
+
+
+@lru_cache(maxsize=None)
+def digit_sprite_sheet(face_size, mono=True):
+    return DigitSpriteSheet(face_size, mono=mono)
+
+
 def load_text(text, rgb=(1, 1, 1), scale=5, display_shape=(64, 64), skip=10):
 
     if text in emoji.UNICODE_EMOJI:
@@ -0,0 +1,95 @@
+from collections import namedtuple
+import time
+import wave
+
+import numpy as np
+
+# One analysis pass per audio block, shared by all visualizers
+AudioBlock = namedtuple('AudioBlock', ['samples', 'bands', 'rms', 'time'])
+
+
+def hz_to_mel(f):
+    return 2595 * np.log10(1 + np.asarray(f, dtype=np.float64) / 700)
+
+
+def mel_to_hz(m):
+    return 700 * (10 ** (np.asarray(m, dtype=np.float64) / 2595) - 1)
+
+
+def band_edges(low, high, bands, scale='linear'):
+    if scale == 'linear':
+        return np.linspace(low, high, bands + 1)
+    if scale == 'log':
+        return np.geomspace(low, high, bands + 1)
+    if scale == 'mel':
+        return mel_to_hz(np.linspace(hz_to_mel(low), hz_to_mel(high), bands + 1))
+    raise ValueError(f'unknown band scale {scale}')
+
+
+class BandAnalyzer:
+    """Turns fixed size audio blocks into band magnitudes.
+
+    Window, FFT size and the bin ranges of every band are set up once, a
+    block then costs one rfft and one ``np.add.reduceat``. Bands narrower
+    than an FFT bin use the first bin above their lower edge. ``smoothing`` is the
+    weight of the previous value in an exponential average, with ``agc`` the
+    bands are divided by a slowly decaying peak instead of a fixed ``gain``.
+    """
+
+    def __init__(self, samplerate, blocksize, bands=32, low=100, high=2000, scale='linear', gain=50,
+                 window='hann', smoothing=0.0, agc=False, agc_decay=0.995, agc_floor=1E-4):
+        self.samplerate = samplerate
+        self.fftsize = int(blocksize)
+        self.window = np.hanning(self.fftsize) if window == 'hann' else np.ones(self.fftsize)
+        self.block = np.zeros(self.fftsize)
+        self.gain = gain
+        self.norm = gain / self.window.sum()
+        freqs = np.fft.rfftfreq(self.fftsize, 1 / samplerate)
+        edges = band_edges(low, min(high, samplerate / 2), bands, scale)
+        starts = np.minimum(np.searchsorted(freqs, edges[:-1]), len(freqs) - 1)
+        # reduceat needs non-decreasing starts, equal starts yield that single bin
+        self.starts = np.maximum.accumulate(starts)
+        self.stop = max(int(np.searchsorted(freqs, edges[-1])), self.starts[-1] + 1)
+        self.counts = np.maximum(np.diff(np.append(self.starts, self.stop)), 1)
+        self.smoothing = smoothing
+        self.agc = agc
+        self.agc_decay = agc_decay
+        self.agc_floor = agc_floor
+        self.peak = agc_floor
+        self.bands = np.zeros(bands)
+
+    def process(self, samples):
+        n = min(len(samples), self.fftsize)
+        self.block[:n] = samples[:n]
+        self.block[n:] = 0
+        self.block *= self.window
+        magnitude = np.abs(np.fft.rfft(self.block))[:self.stop]
+        bands = np.add.reduceat(magnitude, self.starts) / self.counts
+        if self.agc:
+            self.peak = max(bands.max(), self.peak * self.agc_decay, self.agc_floor)
+            bands /= self.peak
+        else:
+            bands *= self.norm
+        if self.smoothing:
+            bands = self.smoothing * self.bands + (1 - self.smoothing) * bands
+        self.bands = bands
+        return bands
+
+    def analyze(self, samples):
+        bands = self.process(samples)
+        return AudioBlock(samples, bands, float(np.sqrt(np.mean(np.square(samples)))), time.perf_counter())
+
+
+def read_wav(wav_file):
+    """Mono float samples in [-1, 1] and the sample rate of a PCM wav file."""
+    with wave.open(str(wav_file), 'rb') as f:
+        width, channels, samplerate = f.getsampwidth(), f.getnchannels(), f.getframerate()
+        data = f.readframes(f.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float64) - 128) / 128
+    elif width in (2, 4):
+        dtype = np.int16 if width == 2 else np.int32
+        samples = np.frombuffer(data, dtype=dtype) / float(np.iinfo(dtype).max + 1)
+    else:
+        raise ValueError(f'unsupported sample width {width}')
+    return samples.reshape(-1, channels).mean(axis=1), samplerate
@@ -0,0 +1,128 @@
+from pathlib import Path
+from threading import Event, Thread
+import time
+
+import numpy as np
+
+from animation_helper.audio_analysis import read_wav
+
+
+class AudioSource:
+    """Delivers mono float blocks of ``blocksize`` samples.
+
+    ``start(callback)`` calls ``callback(samples)`` for every block from a
+    background thread until ``stop``. ``blocks`` yields them as fast as
+    possible for offline use, file and synthetic sources support both.
+    """
+
+    samplerate = None
+    blocksize = None
+
+    def blocks(self):
+        raise NotImplementedError
+
+    def start(self, callback):
+        self.stopped = Event()
+        self.thread = Thread(target=self._feed, args=(callback, ), daemon=True)
+        self.thread.start()
+
+    def _feed(self, callback):
+        # Paced like a sound card, one block per block duration
+        interval = self.blocksize / self.samplerate
+        deadline = time.perf_counter()
+        for block in self.blocks():
+            if self.stopped.is_set():
+                break
+            callback(block)
+            deadline += interval
+            self.stopped.wait(max(0.0, deadline - time.perf_counter()))
+
+    def stop(self):
+        self.stopped.set()
+
+
+class DeviceSource(AudioSource):
+    def __init__(self, device='cap', block_duration=1000 / 60):
+        import sounddevice as sd
+
+        self.sd = sd
+        self.device = device
+        self.samplerate = sd.query_devices(device, 'input')['default_samplerate']
+        self.blocksize = int(self.samplerate * block_duration / 1000)
+        self.stream = None
+
+    def start(self, callback):
+        def device_callback(indata, frames, time, status):
+            if any(indata):
+                callback(indata[:, 0])
+            else:
+                print('no input')
+
+        self.stream = self.sd.InputStream(device=self.device, channels=1, callback=device_callback,
+                                          blocksize=self.blocksize, samplerate=self.samplerate)
+        self.stream.start()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+
+class SampleSource(AudioSource):
+    samples = None
+    loop = True
+
+    def blocks(self):
+        if len(self.samples) < self.blocksize:
+            return
+        while True:
+            for n in range(0, len(self.samples) - self.blocksize + 1, self.blocksize):
+                yield self.samples[n:n + self.blocksize]
+            if not self.loop:
+                return
+
+
+class FileSource(SampleSource):
+    def __init__(self, wav_file, block_duration=1000 / 60, loop=True):
+        samples, self.samplerate = read_wav(wav_file)
+        self.blocksize = int(self.samplerate * block_duration / 1000)
+        # Clips shorter than a block are padded with silence to one full block
+        self.samples = np.pad(samples, (0, max(0, self.blocksize - len(samples))))
+        self.loop = loop
+
+
+class SyntheticSource(SampleSource):
+    """Test signals: a repeating 100 Hz - 2 kHz ``chirp`` or a 120 bpm ``beat``."""
+
+    def __init__(self, kind='chirp', samplerate=48000, block_duration=1000 / 60, seconds=4.0, seed=0):
+        self.samplerate = samplerate
+        self.blocksize = int(samplerate * block_duration / 1000)
+        t = np.arange(int(samplerate * seconds)) / samplerate
+        noise = 0.02 * np.random.default_rng(seed).standard_normal(len(t))
+        if kind == 'chirp':
+            self.samples = 0.5 * np.sin(2 * np.pi * (100 + 1900 / (2 * seconds) * t) * t) + noise
+        elif kind == 'beat':
+            envelope = np.exp(-(t % 0.5) * 20)
+            self.samples = envelope * np.sin(2 * np.pi * 80 * t) + 0.2 * np.sin(2 * np.pi * 440 * t) + noise
+        else:
+            raise ValueError(f'unknown test signal {kind}')
+
+
+def audio_source(name, block_duration=1000 / 60, folder=None, devices=('cap', )):
+    """Opens a source by a name sent by a client.
+
+    'chirp' and 'beat' are test signals, ``devices`` the allowed sound
+    devices and a .wav name is played back only from inside ``folder``.
+    Anything else raises ValueError.
+    """
+    if name in ('chirp', 'beat'):
+        return SyntheticSource(name, block_duration=block_duration)
+    if name in devices:
+        return DeviceSource(name, block_duration=block_duration)
+    if folder is not None and str(name).endswith('.wav'):
+        folder = Path(folder).resolve()
+        wav_file = (folder / name).resolve()
+        if folder in wav_file.parents and wav_file.is_file():
+            return FileSource(wav_file, block_duration=block_duration)
+    raise ValueError(f'unknown audio source {name!r}')
@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class Layer:
+    def __init__(self, transparent=False):
+        self.transparent = transparent
+        self.key = None
+        self.position = None
+        self.patch = None
+        self.mask = None
+        self.rect = None
+
+
+class FrameCompositor:
+    """Keeps the layers of a frame and only repaints the regions that changed.
+
+    Layers are stacked in the order they are first updated. ``update`` calls
+    ``render`` only when the layer key or position changed, a ``None`` key
+    compares the rendered patch instead. Transparent layers skip zero values
+    like the masked blits of the clock faces. ``compose`` returns the same
+    output buffer on every call, so callers have to send or copy it before
+    the next frame.
+    """
+
+    def __init__(self, display_shape=(64, 64)):
+        self.frame = np.zeros((display_shape[0], display_shape[1], 3), dtype=np.uint8)
+        self.layers = {}
+        self.dirty = []
+
+    def update(self, name, position, key, render, transparent=False):
+        layer = self.layers.get(name)
+        if layer is None:
+            layer = self.layers[name] = Layer(transparent)
+        elif key is not None and key == layer.key and position == layer.position:
+            return False
+        patch = render()
+        if key is None:
+            if position == layer.position and layer.patch is not None and np.array_equal(patch, layer.patch):
+                return False
+            patch = patch.copy()
+        if layer.rect is not None:
+            self.dirty.append(layer.rect)
+        layer.key = key
+        layer.position = position
+        layer.patch = patch
+        if transparent:
+            layer.mask = patch != 0
+        layer.rect = (position[0], position[1], position[0] + patch.shape[0], position[1] + patch.shape[1])
+        self.dirty.append(layer.rect)
+        return True
+
+    def remove(self, name):
+        layer = self.layers.pop(name, None)
+        if layer is not None and layer.rect is not None:
+            self.dirty.append(layer.rect)
+
+    def compose(self):
+        for x0, y0, x1, y1 in self.dirty:
+            self.frame[x0:x1, y0:y1] = 0
+            for layer in self.layers.values():
+                lx0, ly0, lx1, ly1 = layer.rect
+                ix0, iy0, ix1, iy1 = max(x0, lx0), max(y0, ly0), min(x1, lx1), min(y1, ly1)
+                if ix0 >= ix1 or iy0 >= iy1:
+                    continue
+                target = self.frame[ix0:ix1, iy0:iy1]
+                source = np.index_exp[ix0 - lx0:ix1 - lx0, iy0 - ly0:iy1 - ly0]
+                if layer.transparent:
+                    np.copyto(target, layer.patch[source], where=layer.mask[source])
+                else:
+                    target[...] = layer.patch[source]
+        self.dirty.clear()
+        return self.frame
@@ -0,0 +1,114 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+from itertools import repeat
+import json
+import os
+import struct
+from threading import Lock, Thread
+
+import numpy as np
+
+# Bump when the base rendering changes, every cached texture is rebuilt then
+BASE_VERSION = 1
+MAGIC = b'JS50BASE'
+# magic, version, sha256 of the inputs, frames, height, width
+HEADER = struct.Struct('<8sI32sIHH')
+HEADER_BYTES = 64
+# (land, ocean) face colors of the base textures
+DEFAULT_PALETTE = ((0.7, 1.0, 0.7), (0.5, 0.5, 1.0))
+
+
+def base_digest(size, num, projection, palette):
+    inputs = json.dumps([BASE_VERSION, size, num, projection, palette])
+    return hashlib.sha256(inputs.encode()).digest()
+
+
+class EarthBaseCache:
+    """Unshaded earth rotations for the world clock, one file per input key.
+
+    A texture is keyed by (size, frame count, projection, palette). Files
+    start with a header holding the version and a hash of these inputs,
+    followed by the raw uint8 frames, so ``load`` maps them without reading
+    and ignores files built from other inputs. Missing textures are rendered
+    by ``render(rotations, size, projection, palette)`` in a process pool
+    from a background thread, ``request`` returns that thread.
+    """
+
+    def __init__(self, folder, render, workers=None):
+        self.folder = folder
+        self.render = render
+        self.workers = workers
+        self.builds = {}
+        self.lock = Lock()
+
+    def path(self, size, num, projection, palette):
+        digest = base_digest(size, num, projection, palette)
+        return self.folder / f'earth_{projection}_{size}_{num}_{digest.hex()[:12]}.bin'
+
+    def load(self, size, num=360, projection='orthographic', palette=DEFAULT_PALETTE):
+        path = self.path(size, num, projection, palette)
+        try:
+            with open(path, 'rb') as f:
+                magic, version, digest, frames, height, width = HEADER.unpack(f.read(HEADER.size))
+        except (FileNotFoundError, struct.error):
+            return None
+        if magic != MAGIC or version != BASE_VERSION or digest != base_digest(size, num, projection, palette):
+            return None
+        return np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER_BYTES, shape=(frames, height, width, 3))
+
+    def request(self, size, num=360, projection='orthographic', palette=DEFAULT_PALETTE):
+        key = (size, num, projection, palette)
+        with self.lock:
+            build = self.builds.get(key)
+            if build is None:
+                build = self.builds[key] = Thread(target=self.build, args=key, daemon=True)
+                build.start()
+        return build
+
+    def get(self, size, num=360, projection='orthographic', palette=DEFAULT_PALETTE, wait=False):
+        base = self.load(size, num, projection, palette)
+        if base is None:
+            build = self.request(size, num, projection, palette)
+            if wait:
+                build.join()
+                base = self.load(size, num, projection, palette)
+        return base
+
+    def write(self, frames, size, num, projection, palette):
+        path = self.path(size, num, projection, palette)
+        temp_file = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        self.folder.mkdir(parents=True, exist_ok=True)
+        with open(temp_file, 'wb') as f:
+            f.seek(HEADER_BYTES)
+            count, height, width = 0, 0, 0
+            for chunk in frames:
+                chunk = np.ascontiguousarray(chunk, dtype=np.uint8)
+                count, height, width = count + len(chunk), chunk.shape[1], chunk.shape[2]
+                f.write(chunk.tobytes())
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, BASE_VERSION, base_digest(size, num, projection, palette),
+                                count, height, width))
+        os.replace(temp_file, path)
+        # Textures of the same shape built from other inputs are stale now
+        for stale in self.folder.glob(f'earth_{projection}_{size}_{num}_*.bin'):
+            if stale != path:
+                stale.unlink()
+        return path
+
+    def build(self, size, num=360, projection='orthographic', palette=DEFAULT_PALETTE):
+        try:
+            workers = self.workers or os.cpu_count() or 1
+            chunks = np.array_split(np.linspace(0, 360, num, endpoint=False), min(num, 4 * workers))
+            with ProcessPoolExecutor(workers) as pool:
+                frames = pool.map(self.render, chunks, repeat(size), repeat(projection), repeat(palette))
+                self.write(frames, size, num, projection, palette)
+        finally:
+            with self.lock:
+                self.builds.pop((size, num, projection, palette), None)
+
+    def migrate(self, legacy_npz, name, size, num=360):
+        """Imports the world_base.npz textures of older setups."""
+        if legacy_npz.is_file():
+            if self.load(size, num) is None:
+                self.write([np.load(legacy_npz)[name]], size, num, 'orthographic', DEFAULT_PALETTE)
+            legacy_npz.unlink()
@@ -0,0 +1,86 @@
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+from threading import Lock
+
+import freetype
+import numpy as np
+
+import config
+
+Glyph = namedtuple('Glyph', ['bitmap', 'top', 'advance'])
+
+
+@lru_cache(maxsize=None)
+def get_face(font_file, face_size):
+    face = freetype.Face(str((config.fonts_folder / font_file).absolute()))
+    face.set_char_size(face_size * 64)
+    return face
+
+
+class GlyphAtlas:
+    """Process wide LRU of rasterized glyphs and kerning pairs.
+
+    Glyphs are keyed by (font, size, char, color) where ``color`` selects the
+    BGRA emoji rendering instead of the 8 bit coverage mask. Bitmaps are
+    read-only and shared by every caller.
+    """
+
+    def __init__(self, max_glyphs=4096):
+        self.max_glyphs = max_glyphs
+        self.glyphs = OrderedDict()
+        self.kernings = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def _lookup(self, cache, key):
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return value
+
+    def _store(self, cache, key, value):
+        cache[key] = value
+        if len(cache) > self.max_glyphs:
+            cache.popitem(last=False)
+
+    def glyph(self, font_file, face_size, char, color=False):
+        key = (font_file, face_size, char, color)
+        with self.lock:
+            glyph = self._lookup(self.glyphs, key)
+            if glyph is None:
+                face = get_face(font_file, face_size)
+                if color:
+                    face.load_char(char, freetype.FT_LOAD_COLOR)
+                else:
+                    face.load_char(char)
+                slot = face.glyph
+                bitmap = slot.bitmap
+                shape = (bitmap.rows, bitmap.width, 4) if color else (bitmap.rows, bitmap.width)
+                data = np.array(bitmap.buffer, dtype=np.uint8).reshape(shape)
+                data.setflags(write=False)
+                glyph = Glyph(data, slot.bitmap_top, slot.advance.x >> 6)
+                self._store(self.glyphs, key, glyph)
+        return glyph
+
+    def kerning(self, font_file, face_size, previous, char):
+        key = (font_file, face_size, previous, char)
+        with self.lock:
+            kerning = self._lookup(self.kernings, key)
+            if kerning is None:
+                kerning = get_face(font_file, face_size).get_kerning(previous, char).x >> 6
+                self._store(self.kernings, key, kerning)
+        return kerning
+
+    def clear(self):
+        with self.lock:
+            self.glyphs.clear()
+            self.kernings.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+glyph_atlas = GlyphAtlas()
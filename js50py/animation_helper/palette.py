@@ -0,0 +1,47 @@
+import colorsys
+from functools import lru_cache
+import time
+
+import numpy as np
+
+
+@lru_cache(maxsize=2048)
+def tint_table(rgb):
+    """(256, 3) uint8 table of every mask value times ``rgb`` (0-1 floats).
+
+    Built with an 8 bit fixed point multiply-shift, so tinting is a single
+    gather instead of float math per pixel.
+    """
+    scale = np.round(np.clip(rgb, 0, 1) * 256).astype(np.uint16)
+    return ((np.arange(256, dtype=np.uint16)[:, None] * scale) >> 8).astype(np.uint8)
+
+
+def tint(mask, rgb=(1, 1, 1), out=None):
+    """Colors a uint8 alpha mask into an (..., 3) uint8 image, optionally into ``out``."""
+    return np.take(tint_table(tuple(rgb)), mask, axis=0, out=out, mode='clip')
+
+
+class HuePalette:
+    """Fully saturated hue circle quantized into ``steps`` colors.
+
+    Colors are returned as shared rgb tuples, so they hit the ``tint_table``
+    cache and stay equal between frames until the hue moves a full step,
+    which keeps the compositor from repainting tinted layers every frame.
+    """
+
+    def __init__(self, steps=1024, saturation=1, value=0.6):
+        self.steps = steps
+        self.colors = [colorsys.hsv_to_rgb(n / steps, saturation, value) for n in range(steps)]
+
+    def __getitem__(self, hue):
+        return self.colors[int(hue * self.steps) % self.steps]
+
+    def cycle(self, period=60, now=None):
+        if now is None:
+            now = time.time()
+        return self[(now % period) / period]
+
+
+@lru_cache(maxsize=None)
+def hue_palette(steps=1024, saturation=1, value=0.6):
+    return HuePalette(steps, saturation, value)
@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class ParticleSystem:
+    """NumPy port of the firework transform feedback of the OpenGLPlayer.
+
+    Particles live in a ring of ``count`` slots as structure-of-arrays
+    float32 buffers in normalized device coordinates. ``step`` is the same
+    position/previous position Verlet step with the constant acceleration
+    ``acc`` as the shader, ``burst`` overwrites the next slots of the ring
+    like ``mass_particle`` and ``render`` rasterizes one pixel per particle
+    into a reused uint8 frame, overlapping particles add up.
+    """
+
+    def __init__(self, count=1024, width=64, height=64, acc=(0.0, -0.0008), rng=None):
+        self.count = count
+        self.width, self.height = width, height
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.acc = np.asarray(acc, dtype=np.float32)[:, None]
+        self.pos = np.zeros((2, count), dtype=np.float32)
+        self.prev = np.zeros((2, count), dtype=np.float32)
+        self.next = np.zeros((2, count), dtype=np.float32)
+        self.color = self.rng.uniform(0, 1, size=(3, count)).astype(np.float32)
+        self.prev[...] = self.kick(count)
+        self.accum = np.zeros((height * width, 3), dtype=np.float32)
+        self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+        self.idx = 0
+
+    def kick(self, size, x=0.0, y=0.0):
+        angle = self.rng.uniform(0.0, 2 * np.pi, size=size)
+        radius = self.rng.uniform(0.005, 0.08, size=size)
+        return np.stack([x + np.cos(angle) * radius, y + np.sin(angle) * radius])
+
+    def burst(self, size, x=0.0, y=0.0, color=None):
+        if color is None:
+            color = self.rng.uniform(0.1, 0.7, size=3)
+        slots = (self.idx + np.arange(size)) % self.count
+        self.pos[0, slots] = x
+        self.pos[1, slots] = y
+        self.prev[:, slots] = self.kick(size, x, y)
+        self.color[:, slots] = np.minimum(np.asarray(color)[:, None] * self.rng.uniform(0.7, 1.8, size=size), 1)
+        self.idx = (self.idx + size) % self.count
+
+    def step(self):
+        # next = pos + (pos - prev) + acc, then rotate the three buffers
+        np.subtract(self.pos, self.prev, out=self.next)
+        self.next += self.pos
+        self.next += self.acc
+        self.prev, self.pos, self.next = self.pos, self.next, self.prev
+
+    def render(self):
+        cols = np.floor((self.pos[0] + 1) * (self.width / 2)).astype(np.intp)
+        rows = self.height - 1 - np.floor((self.pos[1] + 1) * (self.height / 2)).astype(np.intp)
+        visible = (cols >= 0) & (cols < self.width) & (rows >= 0) & (rows < self.height)
+        self.accum[...] = 0
+        np.add.at(self.accum, rows[visible] * self.width + cols[visible], self.color[:, visible].T)
+        np.clip(self.accum, 0, 1, out=self.accum)
+        self.accum *= 255
+        np.copyto(self.frame.reshape(-1, 3), self.accum, casting='unsafe')
+        return self.frame
@@ -1,4 +1,5 @@
 from datetime import datetime
+from functools import lru_cache
 import time
 import matplotlib
 
@@ -8,23 +9,26 @@ import cartopy.crs as ccrs
 from cartopy.feature.nightshade import Nightshade
 from cartopy.feature import NaturalEarthFeature
 import numpy as np
+
+from animation_helper.earth_base import DEFAULT_PALETTE, EarthBaseCache
 import config
 
 plt.style.use('dark_background')
 
 
-OCEAN = NaturalEarthFeature(
-    'physical', 'ocean', '110m',
-    edgecolor='face', facecolor=(0.5, 0.5, 1), zorder=-1)
+PROJECTIONS = {
+    'orthographic': lambda w: ccrs.Orthographic(w, 0),
+}
+
 
-LAND = NaturalEarthFeature(
-    'physical', 'land', '110m',
-    edgecolor='face', facecolor=(0.7, 1.0, 0.7), zorder=-1)
+@lru_cache
+def base_features(palette):
+    land, ocean = palette
+    return (NaturalEarthFeature('physical', 'land', '110m', edgecolor='face', facecolor=land, zorder=-1),
+            NaturalEarthFeature('physical', 'ocean', '110m', edgecolor='face', facecolor=ocean, zorder=-1))
 
-if (config.cache_folder / 'world_base.npz').is_file():
-    wb = np.load(config.cache_folder / 'world_base.npz')['wb_360_52']
-else:
-    wb = None
+
+LAND, OCEAN = base_features(DEFAULT_PALETTE)
 
 
 def render_nightshade(w, size, now=None, alpha=0.6):
@@ -59,20 +63,134 @@ def render_nightshade(w, size, now=None, alpha=0.6):
     # plt.savefig('_test.png')
 
 
-def buffer_night_shade(w, size, now, alpha=0.7):
-    shade = render_nightshade(w, size, now, alpha=alpha)
-    shade = shade[:, :, 0] / np.max(shade[:, :, 0])
-    return (wb[int(round(w))] * shade[:, :, np.newaxis]).astype(np.uint8)
-
-
-def render_single_frame(w, size, now=None, light=True):
+def julian_day(date):
+    year, month = date.year, date.month
+    if month < 3:
+        month += 12
+        year -= 1
+    b = 2 - year // 100 + (year // 100) // 4
+    c = ((date.second / 60 + date.minute) / 60 + date.hour) / 24
+    return int(365.25 * (year + 4716)) + int(30.6001 * (month + 1)) + date.day + b - 1524.5 + c
+
+
+def solar_position(date):
+    # Subsolar point (lat, lon) in degrees, same algorithm as cartopy's Nightshade
+    t_ut1 = (julian_day(date) - 2451545.0) / 36525
+    mean_longitude = (280.460 + 36000.771 * t_ut1) % 360
+    mean_anomaly = np.deg2rad((357.5277233 + 35999.05034 * t_ut1) % 360)
+    ecliptic = np.deg2rad(mean_longitude + 1.914666471 * np.sin(mean_anomaly) + 0.019994643 * np.sin(2 * mean_anomaly))
+    epsilon = np.deg2rad(23.439291 - 0.0130042 * t_ut1)
+    declination = np.arcsin(np.sin(epsilon) * np.sin(ecliptic))
+    gmst = 67310.54841 + (876600 * 3600 + 8640184.812866) * t_ut1 + 0.093104 * t_ut1 ** 2 - 6.2e-6 * t_ut1 ** 3
+    gmst = (gmst % 86400) / 240
+    right_ascension = np.rad2deg(np.arctan2(np.cos(epsilon) * np.sin(ecliptic), np.cos(ecliptic)))
+    lon = -(gmst - right_ascension)
+    if lon < -180:
+        lon += 360
+    return np.rad2deg(declination), lon
+
+
+class OrthographicGlobe:
+    """Per pixel lookup of the orthographic disc used by the world clock.
+
+    The unit vectors of every pixel are computed once for a globe centered on
+    (0, 0). A rotation by ``w`` degrees is applied to the sun vector instead
+    of the pixels, so the day/night terminator of all rotation frames is a
+    single dot product.
+    """
+
+    def __init__(self, size=52):
+        self.size = size
+        centers = (np.arange(size) + 0.5 - size / 2) / (size / 2)
+        x, y = np.meshgrid(centers, -centers)
+        radius = np.hypot(x, y)
+        z = np.sqrt(np.clip(1 - radius ** 2, 0, 1))
+        # (lon 0, lon 90, north) components of every pixel
+        self.normals = np.stack([z, x, y], axis=-1).reshape(-1, 3)
+        # Anti-aliased coverage of the disc edge (matplotlib draws the globe
+        # outline slightly inside the figure) and the width of one pixel on the unit sphere
+        self.coverage = np.clip((1 - radius) * size / 2 + 0.15, 0, 1).reshape(-1)
+        self.pixel = 2 / size
+
+    def sun_altitude(self, rotations, sun):
+        angle = np.deg2rad(np.asarray(rotations, dtype=np.float64))
+        cos, sin = np.cos(angle), np.sin(angle)
+        relative = np.stack([sun[0] * cos + sun[1] * sin, sun[1] * cos - sun[0] * sin,
+                             np.full_like(angle, sun[2])], axis=-1)
+        return relative @ self.normals.T
+
+    def night_shade(self, rotations, sun, alpha=0.7, refraction=-0.83):
+        day = np.clip((self.sun_altitude(rotations, sun) - np.sin(np.deg2rad(refraction))) / self.pixel + 0.5, 0, 1)
+        shade = (1 - alpha + alpha * day) * self.coverage
+        return shade.reshape(-1, self.size, self.size).astype(np.float32)
+
+    def shade_frames(self, base_frames, rotations, sun, alpha=0.7, out=None):
+        shade = self.night_shade(rotations, sun, alpha=alpha)
+        if out is None:
+            out = np.empty(base_frames.shape, dtype=np.uint8)
+        np.multiply(base_frames, shade[..., None], out=out, casting='unsafe')
+        return out
+
+
+class EarthAnimation:
+    """Night shaded earth rotation that is shaded lazily, frame by frame.
+
+    A frame is re-shaded when it is requested and the sun moved by more than
+    one pixel on the disc since that frame was shaded last, so the terminator
+    is only recomputed when it would actually shift. ``frame_key`` changes
+    whenever the returned frame did.
+    """
+
+    def __init__(self, base_frames, num=360, alpha=0.7, sun_interval=1.0):
+        self.rotations = np.linspace(0, 360, num, endpoint=False)
+        self.base_frames = base_rotations(base_frames, self.rotations)
+        self.shape = self.base_frames.shape
+        self.globe = OrthographicGlobe(self.shape[1])
+        self.alpha = alpha
+        self.frames = np.zeros(self.shape, dtype=np.uint8)
+        self.shaded_sun = np.zeros((num, 3))
+        self.versions = [0] * num
+        self.min_cos = np.cos(self.globe.pixel)
+        self.sun_interval = sun_interval
+        self.sun = None
+        self.sun_time = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def current_sun(self):
+        if self.sun is None or time.monotonic() - self.sun_time > self.sun_interval:
+            self.sun = sun_vector(datetime.utcnow())
+            self.sun_time = time.monotonic()
+        return self.sun
+
+    def frame_key(self, n):
+        sun = self.current_sun()
+        if self.shaded_sun[n] @ sun < self.min_cos:
+            self.globe.shade_frames(self.base_frames[n:n + 1], self.rotations[n:n + 1], sun,
+                                    alpha=self.alpha, out=self.frames[n:n + 1])
+            self.shaded_sun[n] = sun
+            self.versions[n] += 1
+        return id(self), n, self.versions[n]
+
+    def __getitem__(self, n):
+        self.frame_key(n)
+        return self.frames[n]
+
+
+def sun_vector(now):
+    lat, lon = np.deg2rad(solar_position(now))
+    return np.array([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def render_single_frame(w, size, now=None, light=True, projection='orthographic', palette=DEFAULT_PALETTE):
     if now is None:
         now = datetime.utcnow()
     fig = plt.figure(figsize=(1, 1), dpi=size)
-    ax = fig.add_subplot(1, 1, 1, projection=ccrs.Orthographic(w, 0))
+    ax = fig.add_subplot(1, 1, 1, projection=PROJECTIONS[projection](w))
     ax.set_facecolor('black')
-    ax.add_feature(LAND)
-    ax.add_feature(OCEAN)
+    for feature in base_features(palette):
+        ax.add_feature(feature)
     for spine in ax.spines.values():
         spine.set_color('black')
     if light:
@@ -99,32 +217,37 @@ def render_single_frame(w, size, now=None, light=True):
     return data.reshape(fig.canvas.get_width_height()[::-1] + (3,))
 
 
-def render_earth(earth_queue, size=52, num=600):
+def render_base_frames(rotations, size, projection='orthographic', palette=DEFAULT_PALETTE):
+    return np.stack([render_single_frame(w, size, light=False, projection=projection, palette=palette)
+                     for w in rotations])
+
+
+earth_bases = EarthBaseCache(config.cache_folder / 'earth_base', render_base_frames)
+
+
+def base_rotations(base_frames, rotations):
+    return base_frames[np.round(np.asarray(rotations) / 360 * len(base_frames)).astype(int) % len(base_frames)]
+
+
+def render_earth(earth_frames, size=52):
+    """Keeps re-rendering the earth with matplotlib into a SharedFrameStore.
+
+    Only runs as the fallback while the base texture of that size is built. The
+    first stack is a quick preview of every tenth rotation, after that the full
+    stack is rendered every 30 s.
+    """
     print('Start')
-    first = True
-    num_loop = 36
-    earth_animation = np.zeros((num_loop, size, size, 3), dtype=np.uint8)
+    num = len(earth_frames)
+    rotations = np.linspace(0, 360, num, endpoint=False)
+    step = max(1, num // 36)
     while True:
-        print('Loop')
-        if earth_queue.empty():
-            print('render')
-            start = time.time()
-            now = datetime.utcnow()
-            if wb is not None and size == 52:
-                for n, w in enumerate(np.linspace(0, 360, num_loop, endpoint=False)):
-                    print(n,w)
-                    earth_animation[n] = buffer_night_shade(w, size, now)
-            else:
-                for n, w in enumerate(np.linspace(0, 360, num_loop, endpoint=False)):
-                    print(n,w)
-                    earth_animation[n] = render_single_frame(w, size, now)
-            earth_queue.put(earth_animation)
-            print(f'{num_loop} images: {time.time() - start:.2f} s')
-            if first:
-                first = False
-                num_loop = num
-                earth_animation = np.zeros((num, size, size, 3), dtype=np.uint8)
-            else:
-                time.sleep(30)
+        start = time.time()
+        now = datetime.utcnow()
+        with earth_frames.write() as earth_animation:
+            for n in range(0, num, step):
+                earth_animation[n:n + step] = render_single_frame(rotations[n], size, now)
+        print(f'{num // step} images: {time.time() - start:.2f} s')
+        if step > 1:
+            step = 1
         else:
-            time.sleep(5)
+            time.sleep(30)
@@ -0,0 +1,45 @@
+from functools import lru_cache
+
+import numpy as np
+from matplotlib import cm
+
+
+@lru_cache(maxsize=None)
+def colormap_lut(name, steps=256):
+    lut = (cm.get_cmap(name, steps)(np.arange(steps))[:, :3] * 255).astype(np.uint8)
+    lut.setflags(write=False)
+    return lut
+
+
+class Spectrogram:
+    """Scrolling spectrogram kept in a circular row buffer.
+
+    The audio thread hands the newest line over with ``push``, a plain
+    attribute swap. Only the render thread touches the rows: ``frame``
+    colors the latest line through a uint8 colormap table into the row at
+    ``head`` and assembles the display with two slice copies, newest row
+    first, into a buffer that is reused for every frame.
+    """
+
+    def __init__(self, width=64, height=64, color_map='inferno', limit=1):
+        self.lut = colormap_lut(color_map)
+        self.scale = len(self.lut) / limit
+        self.rows = np.zeros((height, width, 3), dtype=np.uint8)
+        self.display = np.zeros((height, width, 3), dtype=np.uint8)
+        self.indices = np.zeros(width, dtype=np.uint8)
+        self.head = 0
+        self.line = None
+
+    def push(self, line):
+        self.line = line
+
+    def frame(self):
+        line = self.line
+        if line is not None:
+            self.head = (self.head - 1) % len(self.rows)
+            np.clip(line * self.scale, 0, len(self.lut) - 1, out=self.indices, casting='unsafe')
+            np.take(self.lut, self.indices, axis=0, out=self.rows[self.head], mode='clip')
+        split = len(self.rows) - self.head
+        self.display[:split] = self.rows[self.head:]
+        self.display[split:] = self.rows[:self.head]
+        return self.display
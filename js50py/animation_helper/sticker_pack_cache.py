@@ -8,7 +8,7 @@ from pyrogram.raw.types import InputStickerSetShortName
 from pyrogram.file_id import FileId, FileType
 
 import config
-from animation_helper.animation_functions import cache_animation
+from animation_helper.animation_functions import cache_animation, frame_cache_file
 
 
 class StickerCollector:
@@ -50,7 +50,7 @@ class StickerCollector:
             file_name = f'emoji_u{emoji_code}.tgs'
             sticker = config.telegram_sticker_folder / file_name
 
-            if not sticker.with_suffix('.npz').is_file():
+            if not frame_cache_file(sticker).is_file():
                 fid = FileId(
                     file_type=FileType.DOCUMENT,
                     dc_id=document.dc_id,
@@ -63,7 +63,7 @@ class StickerCollector:
                 loop = asyncio.get_event_loop()
                 task = loop.create_task(downloader)
                 loop.run_until_complete(task)
-                cache_animation(sticker, sticker.with_suffix('.npz'))
+                cache_animation(sticker, frame_cache_file(sticker))
             result_dict[emoji_code] = str(sticker.absolute())
         return result_dict
 
@@ -0,0 +1,121 @@
+import numpy as np
+
+from animation_helper.spectrogram import Spectrogram, colormap_lut
+
+visualizers = {}
+
+
+def register_visualizer(name):
+    def register(cls):
+        visualizers[name] = cls
+        return cls
+    return register
+
+
+def mirror(bands):
+    return np.concatenate((bands[::-1], bands))
+
+
+class Visualizer:
+    """Base of the music visualizers.
+
+    The audio thread hands every analysed ``AudioBlock`` over with ``push``,
+    the render thread turns the latest one into a (height, width, 3) uint8
+    frame with ``frame``. Frames may be reused buffers.
+    """
+
+    def __init__(self, width=64, height=64, color_map='inferno'):
+        self.width, self.height = width, height
+        self.lut = colormap_lut(color_map)
+        self.display = np.zeros((height, width, 3), dtype=np.uint8)
+        self.block = None
+
+    def push(self, block):
+        self.block = block
+
+    def frame(self):
+        raise NotImplementedError
+
+
+@register_visualizer('spectral')
+class SpectralVisualizer(Visualizer):
+    """Mirrored spectrum scrolling down the display."""
+
+    def __init__(self, width=64, height=64, color_map='inferno'):
+        super().__init__(width, height, color_map)
+        self.spectrogram = Spectrogram(width, height, color_map=color_map)
+
+    def push(self, block):
+        self.spectrogram.push(mirror(block.bands))
+
+    def frame(self):
+        return self.spectrogram.frame()
+
+
+@register_visualizer('vu')
+class BarVisualizer(Visualizer):
+    """Mirrored band bars with a falling peak, colored by height."""
+
+    def __init__(self, width=64, height=64, color_map='inferno', fall=0.85):
+        super().__init__(width, height, color_map)
+        self.fall = fall
+        self.levels = np.zeros(width)
+        steps = np.linspace(len(self.lut) - 1, 0, height).astype(int)
+        self.gradient = np.broadcast_to(self.lut[steps][:, None, :], (height, width, 3))
+        self.rows = np.arange(height)[:, None]
+        self.mask = np.zeros((height, width), dtype=bool)
+
+    def frame(self):
+        if self.block is not None:
+            self.levels = np.maximum(np.clip(mirror(self.block.bands), 0, 1) * self.height, self.levels * self.fall)
+        np.greater_equal(self.rows, self.height - self.levels[None, :], out=self.mask)
+        np.multiply(self.gradient, self.mask[..., None], out=self.display, casting='unsafe')
+        return self.display
+
+
+@register_visualizer('beat')
+class BeatVisualizer(Visualizer):
+    """Disc that flashes when the block energy jumps above its running average."""
+
+    def __init__(self, width=64, height=64, color_map='inferno', threshold=1.4, decay=0.85, floor=0.01):
+        super().__init__(width, height, color_map)
+        self.threshold = threshold
+        self.decay = decay
+        self.floor = floor
+        self.average = 0.0
+        self.pulse = 0.0
+        self.last_block = None
+        y, x = np.mgrid[:height, :width]
+        self.radius = np.hypot(y - (height - 1) / 2, x - (width - 1) / 2) / (min(width, height) / 2)
+
+    def frame(self):
+        block = self.block
+        if block is not None and block is not self.last_block:
+            self.last_block = block
+            if block.rms > self.floor and block.rms > self.threshold * self.average:
+                self.pulse = 1.0
+            self.average = 0.95 * self.average + 0.05 * block.rms
+        self.display[...] = 0
+        self.display[self.radius < self.pulse] = self.lut[int(self.pulse * (len(self.lut) - 1))]
+        self.pulse *= self.decay
+        return self.display
+
+
+@register_visualizer('waveform')
+class WaveformVisualizer(Visualizer):
+    """Oscilloscope trace of the block samples with a short afterglow."""
+
+    def __init__(self, width=64, height=64, color_map='inferno', gain=2.0):
+        super().__init__(width, height, color_map)
+        self.gain = gain
+        self.columns = np.arange(width)
+        self.color = self.lut[int(0.8 * (len(self.lut) - 1))]
+
+    def frame(self):
+        np.right_shift(self.display, 1, out=self.display)
+        if self.block is not None:
+            samples = self.block.samples
+            picks = np.linspace(0, len(samples) - 1, self.width).astype(int)
+            rows = np.clip((1 - self.gain * samples[picks]) * (self.height - 1) / 2, 0, self.height - 1).astype(int)
+            self.display[rows, self.columns] = self.color
+        return self.display
@@ -1,13 +1,27 @@
+import argparse
+from collections import namedtuple
+from functools import lru_cache
+import json
+import os
+from threading import Event, Lock, Thread
+import time
+from types import SimpleNamespace
+
 from pyowm import OWM
 import cairosvg
 import config
 import numpy as np
-import json
 
-owm = OWM(config.settings['owm_token'])
-mgr = owm.weather_manager()
 weather_conditions = json.loads((config.base_dir / 'js50py' / 'animation_helper' / 'weather_icon.json').read_text())
 icon_folder = config.cache_folder / 'weather-icons' / 'svg'
+raster_folder = config.cache_folder / 'weather-icons' / 'raster'
+
+WeatherSnapshot = namedtuple('WeatherSnapshot', ['icon', 'temp', 'code', 'time'])
+
+
+@lru_cache
+def weather_manager():
+    return OWM(config.settings['owm_token']).weather_manager()
 
 
 def svg2array(svg_path, size):
@@ -17,10 +31,161 @@ def svg2array(svg_path, size):
     return im.reshape(size, size, 4)[:, :, 3]
 
 
-def get_weather_data(size):
-    observation = mgr.weather_at_place(config.settings['location'])
+icons = {}
+icons_lock = Lock()
+
+
+def weather_icon(icon, size):
+    """Alpha mask of a weather icon, rasterized once per size and kept on disk."""
+    key = (icon, size)
+    with icons_lock:
+        if key in icons:
+            return icons[key]
+    raster_file = raster_folder / f'{icon}_{size}.npy'
+    if raster_file.is_file():
+        mask = np.load(raster_file)
+    else:
+        mask = svg2array(icon_folder / f'wi-{icon}.svg', size)
+        raster_folder.mkdir(parents=True, exist_ok=True)
+        temp_file = raster_file.with_name(f'{raster_file.stem}.{os.getpid()}.tmp')
+        with open(temp_file, 'wb') as f:
+            np.save(f, mask)
+        os.replace(temp_file, raster_file)
+    mask.flags.writeable = False
+    with icons_lock:
+        return icons.setdefault(key, mask)
+
+
+def prerasterize(size):
+    for icon in sorted({condition['icon'] for condition in weather_conditions.values()}):
+        weather_icon(icon, size)
+
+
+def format_temp(kelvin):
+    return f"{round(kelvin-273.15,1):.1f}C"
+
+
+def get_weather_data(size, manager=None, place=None):
+    observation = (manager or weather_manager()).weather_at_place(place or config.settings['location'])
     w = observation.weather
     condition = weather_conditions[str(w.weather_code)]
-    svg_path = icon_folder / f"wi-{condition['icon']}.svg"
-    temp = f"{round(w.temp['temp']-273.15,1):.1f}C"
-    return svg2array(svg_path, size), temp
+    return weather_icon(condition['icon'], size), format_temp(w.temp['temp']), w.weather_code
+
+
+class WeatherService(Thread):
+    """Refreshes the weather in the background for the weather clock.
+
+    ``snapshot`` is replaced as a whole, so the render loop reads it without
+    locking. Failed requests keep the last good snapshot and are retried with
+    exponential backoff. All icons are rasterized after the first request.
+    A service started with the ``snapshot`` of a previous one waits until
+    that is ``interval`` old before it polls again.
+    """
+
+    def __init__(self, size=52, interval=600, manager=None, place=None, min_backoff=10, max_backoff=600,
+                 snapshot=None):
+        super().__init__(daemon=True)
+        self.size = size
+        self.interval = interval
+        self.manager = manager
+        self.place = place
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.stopped = Event()
+        self.users = 0
+        self.snapshot = snapshot or WeatherSnapshot(np.zeros((size, size), dtype=np.uint8), '--.-C', None, 0)
+
+    def refresh(self):
+        icon, temp, code = get_weather_data(self.size, self.manager, self.place)
+        self.snapshot = WeatherSnapshot(icon, temp, code, time.time())
+
+    def run(self):
+        rasterized = self.snapshot.time > 0
+        if rasterized:
+            self.stopped.wait(max(0, self.interval - (time.time() - self.snapshot.time)))
+        while not self.stopped.is_set():
+            try:
+                self.refresh()
+                self.failures = 0
+                delay = self.interval
+            except Exception as e:
+                self.failures += 1
+                delay = min(self.max_backoff, self.min_backoff * 2 ** (self.failures - 1))
+                print(f'Weather update failed ({self.failures}x), retry in {delay} s: {e}')
+            if not rasterized:
+                try:
+                    prerasterize(self.size)
+                except Exception as e:
+                    print(f'Weather icons not rasterized: {e}')
+                rasterized = True
+            self.stopped.wait(delay)
+
+    def stop(self):
+        self.stopped.set()
+
+
+weather_services = {}
+weather_services_lock = Lock()
+
+
+def weather_service(size=52):
+    """Joins the shared weather service for icons of ``size``, starting it if needed.
+
+    Every call takes a reference that is given back with
+    ``release_weather_service``, polling stops when the last user left.
+    """
+    with weather_services_lock:
+        service = weather_services.get(size)
+        if service is None or service.stopped.is_set():
+            service = WeatherService(size, snapshot=service.snapshot if service is not None else None)
+            service.start()
+            weather_services[size] = service
+        service.users += 1
+        return service
+
+
+def release_weather_service(service):
+    with weather_services_lock:
+        service.users -= 1
+        if service.users <= 0:
+            service.stop()
+
+
+class FakeOWM:
+    """Stand-in for the pyowm weather manager.
+
+    Cycles through all known conditions with a new temperature on every
+    request. Every ``fail_every``-th request raises like a network error,
+    ``delay`` simulates a slow API.
+    """
+
+    def __init__(self, fail_every=0, delay=0.0):
+        self.fail_every = fail_every
+        self.delay = delay
+        self.codes = sorted(weather_conditions)
+        self.requests = 0
+
+    def weather_at_place(self, place):
+        self.requests += 1
+        time.sleep(self.delay)
+        if self.fail_every and self.requests % self.fail_every == 0:
+            raise ConnectionError('fake OWM is down')
+        code = int(self.codes[self.requests % len(self.codes)])
+        return SimpleNamespace(weather=SimpleNamespace(weather_code=code, temp={'temp': 263.15 + self.requests % 30}))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the weather service against a fake OWM')
+    parser.add_argument('--interval', type=float, default=2)
+    parser.add_argument('--fail-every', type=int, default=3)
+    parser.add_argument('--delay', type=float, default=0.5)
+    args = parser.parse_args()
+    service = WeatherService(interval=args.interval, manager=FakeOWM(args.fail_every, args.delay),
+                             place='fake', min_backoff=1, max_backoff=8)
+    service.start()
+    while True:
+        start = time.perf_counter()
+        snapshot = service.snapshot
+        print(f'{snapshot.temp:>7} code {snapshot.code}, read in {(time.perf_counter() - start) * 1E6:.1f} us')
+        time.sleep(1)
@@ -0,0 +1,429 @@
+import argparse
+import time
+
+import numpy as np
+
+
+def time_calls(func, repeat=200, setup=None):
+    timings = np.zeros(repeat)
+    for n in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings[n] = time.perf_counter() - start
+    return timings
+
+
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * 4096
+
+
+def report(name, timings):
+    print(f'{name:<28} median {np.median(timings) * 1E6:10.1f} us   '
+          f'p95 {np.percentile(timings, 95) * 1E6:10.1f} us')
+
+
+def bench_text(args):
+    from animation_helper.animation_functions import text2numpy
+    from animation_helper.glyph_atlas import glyph_atlas, get_face
+
+    def cold():
+        glyph_atlas.clear()
+        get_face.cache_clear()
+
+    def draw():
+        for text in ['12', '34', '56', '78']:
+            text2numpy(text, mono=True, include_emoji=False, face_size=18, rgb=(0.6, 0.2, 1))
+
+    report('text2numpy x4 (cold)', time_calls(draw, args.repeat, setup=cold))
+    report('text2numpy x4 (atlas)', time_calls(draw, args.repeat))
+
+
+def bench_digits(args):
+    from animation_helper.animation_functions import text2numpy, digit_sprite_sheet, get_stop_watch
+
+    def draw_text():
+        for value in [1, 23, 45, 67]:
+            text2numpy(f'{value:02d}', mono=True, include_emoji=False, face_size=26, rgb=(0.6, 0.2, 1))
+
+    digits = digit_sprite_sheet(26)
+    report('text2numpy x4', time_calls(draw_text, args.repeat))
+    report('sprite sheet tint x4', time_calls(lambda: digits.tint([1, 23, 45, 67], rgb=(0.6, 0.2, 1)), args.repeat))
+    report('get_stop_watch', time_calls(lambda: get_stop_watch(3723.45, rgb=(0.6, 0.2, 1)), args.repeat))
+
+
+def bench_palette(args):
+    import colorsys
+    from animation_helper.palette import tint, hue_palette
+
+    mask = np.random.randint(0, 256, (64, 64), dtype=np.uint8)
+    out = np.empty((64, 64, 3), dtype=np.uint8)
+    colors = hue_palette()
+    report('hsv_to_rgb', time_calls(lambda: colorsys.hsv_to_rgb(time.time() % 60 / 60, 1, 0.6), args.repeat))
+    report('hue palette cycle', time_calls(lambda: colors.cycle(60), args.repeat))
+    rgb = colors.cycle(60)
+    report('float stack 64x64 icon', time_calls(
+        lambda: np.stack([mask * c for c in rgb], axis=-1).astype(np.uint8), args.repeat))
+    report('lut tint 64x64 icon', time_calls(lambda: tint(mask, rgb, out=out), args.repeat))
+
+
+def bench_spectrogram(args):
+    from matplotlib import cm
+    from animation_helper.spectrogram import Spectrogram
+
+    color_map = cm.get_cmap('inferno')
+    canvas = np.zeros((64, 64, 3), dtype=np.uint8)
+    line = np.random.random(64)
+
+    def roll():
+        nonlocal canvas
+        canvas = np.roll(canvas, 1, axis=0)
+        canvas[0] = color_map(np.minimum(line, 1))[:, :3] * 255
+
+    spectrogram = Spectrogram()
+    report('np.roll + get_cmap row', time_calls(roll, args.repeat))
+    report('ring buffer row', time_calls(lambda: (spectrogram.push(line), spectrogram.frame()), args.repeat))
+
+
+def bench_audio(args):
+    import math
+    from animation_helper.audio_analysis import BandAnalyzer, read_wav
+
+    if args.file is not None:
+        samples, samplerate = read_wav(args.file)
+    else:
+        samplerate = 48000
+        t = np.arange(samplerate * 5) / samplerate
+        samples = 0.5 * np.sin(2 * np.pi * (100 + 380 * t) * t) + 0.05 * np.random.randn(len(t))
+    blocksize = int(samplerate / 60)
+    blocks = [samples[n:n + blocksize] for n in range(0, len(samples) - blocksize, blocksize)]
+    print(f'{len(blocks)} blocks of {blocksize} samples at {samplerate} Hz')
+
+    def padded_fft(block, low=100, high=2000, width=32):
+        delta_f = (high - low) / (width - 1)
+        fftsize = math.ceil(samplerate / delta_f)
+        low_bin = math.floor(low / delta_f)
+        magnitude = np.abs(np.fft.rfft(block, n=fftsize)) * 50 / fftsize
+        return magnitude[low_bin:low_bin + width]
+
+    analyzers = {scale: BandAnalyzer(samplerate, blocksize, scale=scale) for scale in ['linear', 'log', 'mel']}
+    analyzers['mel 64 agc'] = BandAnalyzer(samplerate, blocksize, bands=64, scale='mel', smoothing=0.5, agc=True)
+    block = iter(blocks * (args.repeat // len(blocks) + 1))
+    report('padded rfft per block', time_calls(lambda: padded_fft(next(block)), args.repeat))
+    for name, analyzer in analyzers.items():
+        block = iter(blocks * (args.repeat // len(blocks) + 1))
+        report(f'bands {name}', time_calls(lambda: analyzer.process(next(block)), args.repeat))
+
+
+def bench_visualizers(args):
+    from itertools import islice
+    from animation_helper.audio_analysis import BandAnalyzer
+    from animation_helper.audio_source import FileSource, SyntheticSource
+    from animation_helper.visualizers import visualizers
+
+    source = FileSource(args.file) if args.file is not None else SyntheticSource('beat')
+    analyzer = BandAnalyzer(source.samplerate, source.blocksize)
+    blocks = list(islice(source.blocks(), args.repeat))
+    analysis = iter(blocks * 2)
+    report('analysis pass', time_calls(lambda: analyzer.analyze(next(analysis)), len(blocks)))
+    analysed = [analyzer.analyze(block) for block in blocks]
+    for name, visualizer_class in visualizers.items():
+        visualizer = visualizer_class()
+        block = iter(analysed)
+        report(f'{name} push + frame', time_calls(lambda: (visualizer.push(next(block)), visualizer.frame()), len(analysed)))
+    # Latency of a block through one shared analysis pass and every visualizer
+    instances = [visualizer_class() for visualizer_class in visualizers.values()]
+
+    def all_visualizers():
+        audio_block = analyzer.analyze(blocks[0])
+        for visualizer in instances:
+            visualizer.push(audio_block)
+            visualizer.frame()
+
+    report('block to all frames', time_calls(all_visualizers, len(blocks)))
+
+
+def bench_particles(args):
+    from animation_helper.particles import ParticleSystem
+
+    particles = ParticleSystem(1024)
+    for n in range(10):
+        particles.burst(200, *np.random.uniform(-1, 1, size=2))
+    report('burst 200', time_calls(lambda: particles.burst(200, 0.1, 0.2), args.repeat))
+    report('verlet step 1024', time_calls(particles.step, args.repeat))
+    report('rasterize 1024', time_calls(particles.render, args.repeat))
+
+
+def bench_playlist(args):
+    from playlist import AnimationSource, blend
+
+    a = np.random.randint(0, 255, (64, 64, 3), dtype=np.uint8)
+    b = np.random.randint(0, 255, (64, 64, 3), dtype=np.uint8)
+    out = np.zeros_like(a)
+    scratch = np.zeros((2, ) + a.shape, dtype=np.uint16)
+    report('crossfade blend', time_calls(lambda: blend(a, b, 0.3, out, scratch), args.repeat))
+    report('float blend (reference)', time_calls(lambda: (a * 0.7 + b * 0.3).astype(np.uint8), args.repeat))
+    source = AnimationSource({'animation': True, 'fps': 60,
+                              'frames': np.random.randint(0, 255, (120, 64, 64, 3), dtype=np.uint8)})
+    source.start()
+    report('animation source frame', time_calls(lambda: source.frame(time.perf_counter()), args.repeat))
+
+
+def bench_compositor(args):
+    from animation_helper.animation_functions import get_time_quad
+    from animation_helper.compositor import FrameCompositor
+
+    earth = np.random.randint(0, 255, (360, 52, 52, 3), dtype=np.uint8)
+    compositor = FrameCompositor()
+    report('time quad (fresh buffer)', time_calls(lambda: get_time_quad(earth, 0), args.repeat))
+    report('time quad (static)', time_calls(lambda: get_time_quad(earth, 0, compositor=compositor), args.repeat))
+    frames = iter(range(10 ** 9))
+    report('time quad (earth moving)',
+           time_calls(lambda: get_time_quad(earth, next(frames) % 360, compositor=compositor), args.repeat))
+
+
+def bench_pacer(args):
+    from post_master import FramePacer
+
+    for fps in [30, 120]:
+        render_times = np.random.uniform(0, 0.6 / fps, size=args.repeat)
+
+        last_frame = time.time()
+        start = time.perf_counter()
+        for render_time in render_times:
+            time.sleep(render_time)
+            time.sleep(max(0.0, (1.0 / fps) - (time.time() - last_frame)))
+            last_frame = time.time()
+        print(f'{fps:4d} fps target, sleep pacing    achieved {args.repeat / (time.perf_counter() - start):7.2f} fps')
+
+        pacer = FramePacer(fps)
+        for render_time in render_times:
+            time.sleep(render_time)
+            pacer.wait()
+        stats = pacer.stats()
+        print(f'{fps:4d} fps target, deadline pacing achieved {stats["fps"]:7.2f} fps   '
+              f'jitter {stats["jitter"] * 1E6:7.1f} us   dropped {stats["dropped"]}')
+
+
+def bench_transport(args):
+    from post_master import LEDPost
+
+    led_matrix = LEDPost(address='tcp://127.0.0.1:5599')
+    frame = np.random.randint(0, 255, (64, 64, 3), dtype=np.uint8)
+    mover = np.random.randint(0, 255, (64, 200, 3), dtype=np.uint8)
+
+    def legacy(matrix):
+        led_matrix.socket.send_multipart([led_matrix.channel, matrix.tobytes(order='C')])
+
+    report('animation tobytes', time_calls(lambda: legacy(frame), args.repeat))
+    report('animation buffer', time_calls(lambda: led_matrix.publish(frame), args.repeat))
+    report('mover tobytes', time_calls(lambda: legacy(mover[:, 10:74]), args.repeat))
+    report('mover staging', time_calls(lambda: led_matrix.publish(mover[:, 10:74]), args.repeat))
+
+
+def bench_control(args):
+    import zmq
+
+    from control_plane import ControlServer, control_client
+
+    server = ControlServer('tcp://127.0.0.1:5598')
+    client = control_client('tcp://127.0.0.1:5598', timeout=1000)
+    frames = np.zeros((4, 64, 64, 3), dtype=np.uint8)
+    received = []
+
+    def round_trip(meta_data, data=None):
+        if data is None:
+            client.send_json(meta_data)
+        else:
+            client.send_json(meta_data, zmq.SNDMORE)
+            client.send(data)
+        for _ in range(10):
+            received.extend(server.receive(timeout=100))
+            if received:
+                break
+        else:
+            raise RuntimeError('request dropped by the control server')
+        meta, payload = received.pop()
+        # Same socket options as the bot, a dropped envelope shows up as a timeout here
+        assert client.recv_string() == 'received' and meta == meta_data
+        return payload
+
+    payload = round_trip({'type': 'animation_data', 'dtype': 'uint8', 'shape': list(frames.shape)}, frames)
+    assert bytes(memoryview(payload)) == frames.tobytes()
+    report('text round trip', time_calls(lambda: round_trip({'type': 'text', 'text': 'js50'}), args.repeat))
+    report('animation data round trip', time_calls(lambda: round_trip(
+        {'type': 'animation_data', 'dtype': 'uint8', 'shape': list(frames.shape)}, frames), args.repeat))
+
+
+def bench_codec(args):
+    from frame_codec import FrameEncoder, FrameDecoder
+
+    rng = np.random.default_rng(0)
+    static = np.zeros((64, 64, 3), dtype=np.uint8)
+    static[8:56, 8:56] = 255 * (rng.random((48, 48, 1)) > 0.5)
+    mover = rng.integers(0, 255, (64, 200, 3), dtype=np.uint8) * (rng.random((64, 200, 1)) > 0.8)
+    clock = static.copy()
+    video = rng.integers(0, 255, (64, 64, 3), dtype=np.uint8)
+
+    def clock_frames(n):
+        clock[20:30, 20:30] = n % 255
+        return clock
+
+    sequences = {
+        'static qr': lambda n: static,
+        'mover': lambda n: np.ascontiguousarray(mover[:, n % 136:n % 136 + 64]),
+        'clock': clock_frames,
+        'noise video': lambda n: rng.integers(0, 255, (64, 64, 3), dtype=np.uint8),
+    }
+    for name, sequence in sequences.items():
+        encoder, decoder = FrameEncoder(), FrameDecoder()
+        sent, mismatches, encode_time, decode_time = 0, 0, 0.0, 0.0
+        for n in range(args.repeat):
+            frame = sequence(n)
+            start = time.perf_counter()
+            header, payload = encoder.encode(frame)
+            encode_time += time.perf_counter() - start
+            start = time.perf_counter()
+            decoded = decoder.decode(header, payload)
+            decode_time += time.perf_counter() - start
+            sent += len(header) + len(payload)
+            mismatches += not np.array_equal(decoded, frame)
+        print(f'{name:<14} {sent / args.repeat:8.0f} B/frame (raw {video.nbytes})   '
+              f'encode {encode_time / args.repeat * 1E6:6.1f} us   decode {decode_time / args.repeat * 1E6:6.1f} us   '
+              f'mismatches {mismatches}')
+
+
+def bench_sticker_cache(args):
+    import tempfile
+    from pathlib import Path
+    from animation_helper.animation_functions import save_frames, load_frames
+
+    # 3 s of a 64x64 sticker, mostly flat areas like the rendered tgs frames
+    frames = np.zeros((180, 64, 64, 3), dtype=np.uint8)
+    for n in range(len(frames)):
+        frames[n, 16 + n % 32:48, 10:54] = (n, 255 - n, 128)
+    with tempfile.TemporaryDirectory() as folder:
+        legacy_file = Path(folder) / 'sticker.npz'
+        cache_file = Path(folder) / 'sticker.npy'
+        np.savez_compressed(legacy_file, frames=frames)
+        save_frames(cache_file, frames)
+
+        for name, load in [('npz', lambda: np.load(legacy_file)['frames']), ('mmap npy', lambda: load_frames(cache_file))]:
+            before = rss()
+            start = time.perf_counter()
+            animation = load()
+            first_frame = np.array(animation[0])
+            switch = time.perf_counter() - start
+            print(f'{name:<10} switch to first frame {switch * 1E3:7.2f} ms   RSS +{(rss() - before) / 1024:7.0f} kB')
+            del animation, first_frame
+
+
+def bench_video(args):
+    import skvideo.io
+    from animation_helper.animation_functions import VideoStream
+
+    if args.file is None:
+        print('pass a video with --file')
+        return
+    for name, load in [('vread', lambda: skvideo.io.vread(args.file)), ('stream', lambda: VideoStream(args.file))]:
+        before = rss()
+        start = time.perf_counter()
+        frames = iter(load())
+        next(frames)
+        first_frame = time.perf_counter() - start
+        count = 1 + sum(1 for _ in frames)
+        print(f'{name:<8} first frame {first_frame * 1E3:8.1f} ms   all {count} frames {(time.perf_counter() - start):6.2f} s   '
+              f'RSS +{(rss() - before) / 1024:8.0f} kB')
+
+
+def bench_earth(args):
+    from datetime import datetime
+    from animation_helper.render_earth import OrthographicGlobe, EarthAnimation, render_nightshade, sun_vector
+
+    globe = OrthographicGlobe(52)
+    base_frames = np.random.randint(0, 255, (360, 52, 52, 3), dtype=np.uint8)
+    out = np.empty_like(base_frames)
+    rotations = np.arange(360)
+    report('numpy shade 360 frames', time_calls(
+        lambda: globe.shade_frames(base_frames, rotations, sun_vector(datetime.utcnow()), out=out), 20))
+    report('matplotlib shade 1 frame', time_calls(lambda: render_nightshade(0, 52, datetime.utcnow()), 5))
+
+    earth = EarthAnimation(base_frames)
+    frames = iter(range(10 ** 9))
+    report('lazy frame (first pass)', time_calls(lambda: earth[next(frames) % 360], 360))
+    report('lazy frame (sun unmoved)', time_calls(lambda: earth[next(frames) % 360], 360))
+
+
+def bench_earth_base(args):
+    import tempfile
+    from pathlib import Path
+    from animation_helper.earth_base import DEFAULT_PALETTE, EarthBaseCache
+
+    frames = np.random.randint(0, 255, (360, 52, 52, 3), dtype=np.uint8)
+    with tempfile.TemporaryDirectory() as folder:
+        legacy_file = Path(folder) / 'world_base.npz'
+        np.savez(legacy_file, wb_360_52=frames)
+        bases = EarthBaseCache(Path(folder), render=None)
+        bases.write([frames], 52, 360, 'orthographic', DEFAULT_PALETTE)
+        report('world_base.npz load', time_calls(lambda: np.load(legacy_file)['wb_360_52'], 20))
+        report('base texture map', time_calls(lambda: bases.load(52), args.repeat))
+
+
+def bench_shared_frames(args):
+    from multiprocessing import Queue
+    from shared_frames import SharedFrameStore
+
+    frames = np.random.randint(0, 255, (360, 52, 52, 3), dtype=np.uint8)
+    queue = Queue(1)
+
+    def queue_handoff():
+        queue.put(frames)
+        queue.get()
+
+    store = SharedFrameStore(frames.shape)
+
+    def store_handoff():
+        with store.write() as back:
+            back[...] = frames
+        store[0]
+
+    out = np.empty(frames.shape[1:], dtype=np.uint8)
+    report('Queue(1) 360 frames', time_calls(queue_handoff, 20))
+    report('shared store 360 frames', time_calls(store_handoff, 20))
+    report('shared store read 1 frame', time_calls(lambda: store.read(0, out), args.repeat))
+    store.unlink()
+
+
+benchmarks = {
+    'text': bench_text,
+    'digits': bench_digits,
+    'palette': bench_palette,
+    'compositor': bench_compositor,
+    'pacer': bench_pacer,
+    'transport': bench_transport,
+    'control': bench_control,
+    'codec': bench_codec,
+    'sticker_cache': bench_sticker_cache,
+    'video': bench_video,
+    'earth': bench_earth,
+    'spectrogram': bench_spectrogram,
+    'audio': bench_audio,
+    'visualizers': bench_visualizers,
+    'particles': bench_particles,
+    'playlist': bench_playlist,
+    'shared_frames': bench_shared_frames,
+    'earth_base': bench_earth_base,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render path micro benchmarks')
+    parser.add_argument('name', choices=sorted(benchmarks) + ['all'])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--file', help='input file for the video and audio (wav) benchmarks')
+    args = parser.parse_args()
+    for name, bench in benchmarks.items():
+        if args.name in (name, 'all'):
+            print(f'== {name}')
+            bench(args)
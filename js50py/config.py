@@ -15,6 +15,38 @@ telegram_sticker_folder = cache_folder / 'animated_sticker'
 telegram_video_folder = cache_folder / 'video'
 tgs_tool_folder = base_dir / 'tools' / 'tgs'
 settings_file = base_dir / 'config.json'
+animation_usage_file = cache_folder / 'animation_usage.json'
+
+# Size budget of the memory mapped animations the player keeps open for instant replay
+animation_cache_size = 64 * 1024 * 1024
+animation_prewarm = 8
+# Request counts for the prewarm are written to the SD card every n requests
+animation_usage_save_every = 16
+
+# Disc size of the world clock earth, base textures are built on first use
+earth_size = 52
+
+# 'gl' (moderngl EGL), 'numpy' or 'auto' to use GL only if a context can be created
+opengl_backend = 'auto'
+
+# Music visualizer input: the default sound device, the devices clients may
+# pick and the folder of the .wav files they may play
+audio_device = 'cap'
+audio_devices = ('cap', )
+audio_folder = cache_folder / 'audio'
+
+# Control socket: threads loading requested animations and the poll interval in ms
+control_workers = 2
+control_poll_ms = 50
+# Playlist slots and crossfades in seconds, items are prerendered ahead of their slot.
+# Commands sent while a playlist runs interrupt it for playlist_interrupt_duration.
+playlist_duration = 30
+playlist_crossfade = 0.5
+playlist_preroll = 2.0
+playlist_interrupt_duration = 30
+playlist_interrupt_priority = 1
+# How long the bot waits for the ack of the player
+control_timeout_ms = 2000
 
 log_level = logging.WARNING
 
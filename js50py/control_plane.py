@@ -0,0 +1,174 @@
+from collections import namedtuple
+import heapq
+import json
+from queue import Empty, SimpleQueue
+from threading import Condition, Thread
+
+import zmq
+
+# Lower runs first. Cheap switches jump ahead of queued cache and render loads.
+PRIORITIES = {
+    'cancel': 0,
+    'settings': 0,
+    'playlist': 1,
+    'clock': 1,
+    'apple': 1,
+    'music': 1,
+    'opengl': 1,
+    'animation_data': 2,
+    'text': 2,
+    'qr': 2,
+    'cache': 3,
+}
+
+Command = namedtuple('Command', ['priority', 'seq', 'slot', 'meta_data', 'payload'])
+
+
+def command_slot(meta_data):
+    """Commands in the same slot supersede each other, everything but settings fights for the display."""
+    return 'settings' if meta_data.get('type') == 'settings' else 'display'
+
+
+def control_client(address='tcp://127.0.0.1:2222', timeout=2000, context=None):
+    """REQ socket of the bot. The player acks before loading, a missing reply
+    within ``timeout`` ms means it is down; relaxed and correlated REQ lets
+    the next request go out instead of blocking the socket for good."""
+    context = context or zmq.Context.instance()
+    socket = context.socket(zmq.REQ)
+    socket.setsockopt(zmq.RCVTIMEO, timeout)
+    socket.setsockopt(zmq.REQ_RELAXED, 1)
+    socket.setsockopt(zmq.REQ_CORRELATE, 1)
+    socket.connect(address)
+    return socket
+
+
+class ControlServer:
+    """ROUTER side of the control socket.
+
+    Every request is acknowledged with ``'received'`` as soon as it is read,
+    before anything is loaded, so the REQ sockets of the bot never wait on a
+    render and a failing load can not wedge them. ``receive`` polls for up
+    to ``timeout`` ms and returns all waiting ``(meta_data, payload)`` pairs,
+    ``payload`` is the optional second frame (e.g. raw animation data).
+    """
+
+    def __init__(self, address='tcp://127.0.0.1:2222', context=None):
+        context = context or zmq.Context.instance()
+        self.socket = context.socket(zmq.ROUTER)
+        self.socket.bind(address)
+        self.poller = zmq.Poller()
+        self.poller.register(self.socket, zmq.POLLIN)
+
+    def receive(self, timeout=50):
+        requests = []
+        if not self.poller.poll(timeout):
+            return requests
+        while True:
+            try:
+                parts = self.socket.recv_multipart(zmq.NOBLOCK, copy=False)
+            except zmq.Again:
+                return requests
+            # The reply envelope runs up to the first empty delimiter, REQ peers with
+            # REQ_CORRELATE put a request id before it, DEALER peers may send none
+            envelope = next((n + 1 for n, part in enumerate(parts[1:], 1) if not part.bytes), 1)
+            self.socket.send_multipart(parts[:envelope] + [b'received'])
+            try:
+                meta_data = json.loads(parts[envelope].bytes)
+            except (IndexError, ValueError) as e:
+                print(f'Dropped malformed control message: {e}')
+                continue
+            payload = parts[envelope + 1] if len(parts) > envelope + 1 else None
+            requests.append((meta_data, payload))
+
+
+class CommandQueue:
+    """Priority queue of control commands, loaded by a pool of worker threads.
+
+    ``put`` supersedes every queued command of the same slot, a newer sticker
+    replaces the one still waiting instead of queueing behind it. Loads that
+    are already running finish, but ``finished`` only hands out results that
+    are still the newest of their slot, so a slow video never overwrites a
+    sticker sent after it. A ``cancel`` command drops whatever is pending for
+    the display. Failing loads are reported and dropped. ``discard`` is
+    called with the meta data of every command dropped before it was loaded.
+    """
+
+    def __init__(self, load, workers=2, priorities=PRIORITIES, discard=None):
+        self.load = load
+        self.discard = discard
+        self.priorities = priorities
+        self.pending = []
+        self.latest = {}
+        self.seq = 0
+        self.condition = Condition()
+        self.results = SimpleQueue()
+        self.workers = [Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def put(self, meta_data, payload=None):
+        slot = command_slot(meta_data)
+        with self.condition:
+            self.seq += 1
+            self.latest[slot] = self.seq
+            dropped = [command for command in self.pending if command.slot == slot]
+            self.pending = [command for command in self.pending if command.slot != slot]
+            heapq.heapify(self.pending)
+            if meta_data.get('type') != 'cancel':
+                priority = self.priorities.get(meta_data.get('type'), max(self.priorities.values()))
+                heapq.heappush(self.pending, Command(priority, self.seq, slot, meta_data, payload))
+                self.condition.notify()
+            seq = self.seq
+        for command in dropped:
+            self._discard(command)
+        return seq
+
+    def __len__(self):
+        with self.condition:
+            return len(self.pending)
+
+    def _discard(self, command):
+        if self.discard is not None:
+            try:
+                self.discard(command.meta_data)
+            except Exception as e:
+                print(f'Discarding {command.meta_data.get("type")} failed: {e!r}')
+
+    def superseded(self, command):
+        return command.seq < self.latest.get(command.slot, 0)
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                command = heapq.heappop(self.pending)
+            if self.superseded(command):
+                self._discard(command)
+                continue
+            try:
+                result = self.load(command.meta_data, command.payload)
+            except Exception as e:
+                print(f'Loading {command.meta_data.get("type")} failed: {e!r}')
+                continue
+            self.results.put((command, result))
+
+    def apply(self, show):
+        """Hands every finished result to ``show``. One that fails to show is
+        reported, the control loop and its acks keep running."""
+        for command, result in self.finished():
+            try:
+                show(result)
+            except Exception as e:
+                print(f'Showing {command.meta_data.get("type")} failed: {e!r}')
+
+    def finished(self, timeout=None):
+        """Yields ``(command, result)`` of completed loads that were not superseded meanwhile."""
+        while True:
+            try:
+                command, result = self.results.get(timeout=timeout) if timeout else self.results.get_nowait()
+            except Empty:
+                return
+            timeout = None
+            if not self.superseded(command):
+                yield command, result
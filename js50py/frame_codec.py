@@ -0,0 +1,163 @@
+import argparse
+import struct
+
+import numpy as np
+
+# Compressed frames are published as [channel, header, payload] on their own
+# channel byte. zmq subscriptions match by prefix, so it must not start with
+# the raw channel b'A' the lamp_pusher subscribes to.
+DELTA_CHANNEL = b'D'
+HEADER = struct.Struct('<BBIHHH')
+VERSION = 1
+KEY_RAW, KEY_RLE, DELTA_RLE = range(3)
+# A run costs 8 bytes of bookkeeping, shorter zero gaps are cheaper as literals
+MIN_GAP = 8
+EMPTY_DELTA = struct.pack('<I', 0)
+
+
+def run_mask(starts, ends, size):
+    marks = np.zeros(size + 1, dtype=np.int32)
+    marks[starts] += 1
+    marks[ends] -= 1
+    return np.cumsum(marks[:-1]) > 0
+
+
+def rle_encode(data):
+    data = data.reshape(-1)
+    edges = np.diff((data != 0).view(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if len(starts) > 1:
+        keep = (starts[1:] - ends[:-1]) >= MIN_GAP
+        starts = starts[np.concatenate(([True], keep))]
+        ends = ends[np.concatenate((keep, [True]))]
+    skips = starts - np.concatenate(([0], ends[:-1]))
+    lengths = ends - starts
+    return b''.join([struct.pack('<I', len(starts)), skips.astype('<u4').tobytes(),
+                     lengths.astype('<u4').tobytes(), data[run_mask(starts, ends, data.size)].tobytes()])
+
+
+def rle_decode(payload, size, out=None):
+    count, = struct.unpack_from('<I', payload)
+    skips = np.frombuffer(payload, dtype='<u4', count=count, offset=4).astype(np.int64)
+    lengths = np.frombuffer(payload, dtype='<u4', count=count, offset=4 + 4 * count).astype(np.int64)
+    literals = np.frombuffer(payload, dtype=np.uint8, offset=4 + 8 * count)
+    if out is None:
+        out = np.zeros(size, dtype=np.uint8)
+    else:
+        out[:] = 0
+    ends = np.cumsum(skips + lengths)
+    out[run_mask(ends - lengths, ends, size)] = literals
+    return out
+
+
+class FrameEncoder:
+    """Turns uint8 frames into keyframes and XOR delta frames.
+
+    A keyframe is sent every ``keyframe_interval`` frames and whenever the
+    shape changes, so subscribers that join late or lose a frame resync.
+    """
+
+    def __init__(self, keyframe_interval=60):
+        self.keyframe_interval = keyframe_interval
+        self.previous = None
+        self.delta = None
+        self.sequence = 0
+        self.since_keyframe = 0
+
+    def encode(self, frame):
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        height, width, channels = frame.shape
+        if self.previous is None or self.previous.shape != frame.shape or \
+                self.since_keyframe >= self.keyframe_interval:
+            self.previous = frame.copy()
+            self.delta = np.empty_like(self.previous)
+            self.since_keyframe = 0
+            kind, payload = KEY_RLE, rle_encode(frame)
+            if len(payload) >= frame.nbytes:
+                kind, payload = KEY_RAW, frame.tobytes()
+        else:
+            np.bitwise_xor(frame, self.previous, out=self.delta)
+            self.previous[...] = frame
+            self.since_keyframe += 1
+            kind, payload = DELTA_RLE, rle_encode(self.delta) if self.delta.any() else EMPTY_DELTA
+            if len(payload) >= frame.nbytes:
+                self.since_keyframe = 0
+                kind, payload = KEY_RAW, frame.tobytes()
+        return [HEADER.pack(VERSION, kind, self.sequence, height, width, channels), payload]
+
+
+class FrameDecoder:
+    """Reference decoder for the delta channel.
+
+    ``decode`` returns the current frame (a reused buffer) or ``None`` while
+    waiting for a keyframe after a missing delta.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.delta = None
+        self.sequence = None
+
+    def decode(self, header, payload):
+        version, kind, sequence, height, width, channels = HEADER.unpack(header)
+        if version != VERSION:
+            raise ValueError(f'unknown frame codec version {version}')
+        shape = (height, width, channels)
+        if kind == DELTA_RLE:
+            if self.sequence is None or sequence != (self.sequence + 1) & 0xFFFFFFFF or self.frame.shape != shape:
+                self.sequence = None
+                return None
+            rle_decode(payload, self.frame.size, out=self.delta)
+            np.bitwise_xor(self.frame.reshape(-1), self.delta, out=self.frame.reshape(-1))
+        else:
+            if self.frame is None or self.frame.shape != shape:
+                self.frame = np.zeros(shape, dtype=np.uint8)
+                self.delta = np.zeros(self.frame.size, dtype=np.uint8)
+            if kind == KEY_RAW:
+                self.frame.reshape(-1)[:] = np.frombuffer(payload, dtype=np.uint8)
+            else:
+                rle_decode(payload, self.frame.size, out=self.frame.reshape(-1))
+        self.sequence = sequence
+        return self.frame
+
+
+def check_subscriber(address, raw_channel=b'A', report_every=300):
+    """Stand-in for lamp_pusher that decodes the delta channel.
+
+    Run a LEDPost with ``raw=True, compress=True`` against it: every decoded
+    frame is compared with the raw frame published just before it.
+    """
+    import zmq
+
+    socket = zmq.Context().socket(zmq.SUB)
+    socket.bind(address)
+    socket.setsockopt(zmq.SUBSCRIBE, raw_channel)
+    socket.setsockopt(zmq.SUBSCRIBE, DELTA_CHANNEL)
+    decoder = FrameDecoder()
+    raw_frame = None
+    frames, mismatches, unsynced, raw_bytes, delta_bytes = 0, 0, 0, 0, 0
+    print(f'Listening on {address} ...')
+    while True:
+        parts = socket.recv_multipart()
+        if parts[0] == raw_channel:
+            raw_frame = parts[1]
+            continue
+        frame = decoder.decode(parts[1], parts[2])
+        frames += 1
+        delta_bytes += len(parts[1]) + len(parts[2])
+        if frame is None:
+            unsynced += 1
+        elif raw_frame is not None:
+            raw_bytes += len(raw_frame)
+            mismatches += frame.tobytes() != raw_frame
+        if frames % report_every == 0:
+            print(f'{frames} frames: {delta_bytes / frames:.0f} B/frame delta, '
+                  f'{raw_bytes / max(1, frames - unsynced):.0f} B/frame raw, '
+                  f'{mismatches} mismatches, {unsynced} waiting for keyframe')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Delta channel test subscriber')
+    parser.add_argument('--address', default='tcp://127.0.0.1:5555')
+    check_subscriber(parser.parse_args().address)
@@ -13,7 +13,8 @@ from telegram.ext import CommandHandler, MessageHandler, CallbackQueryHandler
 from telegram.ext import Updater, Filters
 
 import config
-from animation_helper.animation_functions import prepare_animation, prepare_video, load_photo
+from control_plane import control_client
+from animation_helper.animation_functions import load_photo, frame_cache_file
 
 zmq_context = zmq.Context()
 
@@ -25,8 +26,7 @@ class FilterEmoji(MessageFilter):
 
 #  Socket to talk to server
 print("Connecting to tcp://127.0.0.1:2222")
-socket = zmq_context.socket(zmq.REQ)
-socket.connect("tcp://127.0.0.1:2222")
+socket = control_client("tcp://127.0.0.1:2222", config.control_timeout_ms, zmq_context)
 print('Connected')
 
 
@@ -70,6 +70,16 @@ def download_to_buffer(file_id, context):
     return raw_data
 
 
+def receive_reply(socket):
+    try:
+        message = socket.recv_string()
+    except zmq.Again:
+        print('No reply from the player')
+        return None
+    print("Received reply %s" % message)
+    return message
+
+
 def send_animation_data(socket, np_array, fps=30, flags=0, copy=True, track=False):
     meta_data = dict(
         type='animation_data',
@@ -80,19 +90,18 @@ def send_animation_data(socket, np_array, fps=30, flags=0, copy=True, track=Fals
     print(f'Sending animation data ({np_array.shape[0]} frames)')
     socket.send_json(meta_data, flags | zmq.SNDMORE)
     socket.send(np_array, flags, copy=copy, track=track)
-    message = socket.recv_string()
-    print("Received reply %s" % message)
+    receive_reply(socket)
 
 
-def send_music(socket, name, flags=0):
+def send_music(socket, name, source=None, flags=0):
     meta_data = dict(
         type='music',
-        name=name
+        name=name,
+        source=source
     )
     print(f'Sending music viz {name}')
     socket.send_json(meta_data, flags)
-    message = socket.recv_string()
-    print("Received reply %s" % message)
+    receive_reply(socket)
 
 
 def send_text(socket, text, flags=0):
@@ -102,8 +111,7 @@ def send_text(socket, text, flags=0):
     )
     print(f'Sending text {text}')
     socket.send_json(meta_data, flags)
-    message = socket.recv_string()
-    print("Received reply %s" % message)
+    receive_reply(socket)
 
 
 def send_qr(socket, data, flags=0):
@@ -113,8 +121,7 @@ def send_qr(socket, data, flags=0):
     )
     print(f'Sending QR code "{data}"')
     socket.send_json(meta_data, flags)
-    message = socket.recv_string()
-    print("Received reply %s" % message)
+    receive_reply(socket)
 
 
 def send_apple(socket, command, flags=0):
@@ -124,8 +131,7 @@ def send_apple(socket, command, flags=0):
     )
     print(f'Apple Home Kit {command}"')
     socket.send_json(meta_data, flags)
-    message = socket.recv_string()
-    print(f"Received: {message}")
+    receive_reply(socket)
 
 
 def send_opengl(socket, flags=0):
@@ -134,8 +140,7 @@ def send_opengl(socket, flags=0):
     )
     print(f'Sending openGL')
     socket.send_json(meta_data, flags)
-    message = socket.recv_string()
-    print("Received reply %s" % message)
+    receive_reply(socket)
 
 
 def send_clock(socket, clock_type, task=None, flags=0):
@@ -149,20 +154,33 @@ def send_clock(socket, clock_type, task=None, flags=0):
     )
     print(f'Sending clock')
     socket.send_json(meta_data, flags)
-    message = socket.recv_string()
-    print("Received reply %s" % message)
+    receive_reply(socket)
 
 
-def send_cache_file(socket, file_path, file_type='video', flags=0):
+def send_cache_file(socket, file_path, file_type='video', raw_file=None, flags=0):
     meta_data = dict(
         type='cache',
         file_type=file_type,
         cache=str(file_path.absolute()),
     )
+    if raw_file is not None:
+        meta_data['raw'] = str(raw_file.absolute())
     print(f'Sending {file_type} {file_path.absolute()}')
     socket.send_json(meta_data, flags)
-    message = socket.recv_string()
-    print("Received reply %s" % message)
+    receive_reply(socket)
+
+
+def send_playlist(socket, items, crossfade=None, loop=True, flags=0):
+    meta_data = dict(
+        type='playlist',
+        items=items,
+        loop=loop,
+    )
+    if crossfade is not None:
+        meta_data['crossfade'] = crossfade
+    print(f'Sending playlist ({len(items)} items)')
+    socket.send_json(meta_data, flags)
+    receive_reply(socket)
 
 
 def start(update, context):
@@ -202,6 +220,21 @@ def apple_lamp(update, context):
     update.message.reply_text('Please choose:', reply_markup=reply_markup)
 
 
+@restricted_admin
+def playlist(update, context):
+    # Items are control commands with a duration and priority, kept in config.json
+    if update.message.text.partition('/playlist')[2].strip() == 'stop':
+        send_playlist(socket, [])
+        update.message.reply_text('The playlist is stopped.')
+        return
+    items = config.settings.get('playlist', [])
+    if not items:
+        update.message.reply_text('There is no playlist in the settings.')
+        return
+    send_playlist(socket, items)
+    update.message.reply_text(f'The playlist with {len(items)} items is now on display.')
+
+
 @restricted_admin
 def admin(update, context):
 
@@ -281,7 +314,10 @@ def stopwatch_key(update, context, query):
 def animation(update, context):
     keyboard = [[InlineKeyboardButton("Rainfall", callback_data='set_animation_rainfall'),
                  InlineKeyboardButton("Firework", callback_data='set_animation_firework')],
-                [InlineKeyboardButton("Soundtrace", callback_data='set_animation_music'),]]
+                [InlineKeyboardButton("Soundtrace", callback_data='set_animation_music'),
+                 InlineKeyboardButton("VU meter", callback_data='set_animation_music_vu')],
+                [InlineKeyboardButton("Beat", callback_data='set_animation_music_beat'),
+                 InlineKeyboardButton("Waveform", callback_data='set_animation_music_waveform')]]
 
     reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -296,8 +332,8 @@ def callback(update, context):
     # Some clients may have trouble otherwise. See https://core.telegram.org/bots/api#callbackquery
     need_answer = True
     query.answer()
-    if query.data == 'set_animation_music':
-        send_music(socket, name='spectral')
+    if query.data.startswith('set_animation_music'):
+        send_music(socket, name=query.data[len('set_animation_music_'):] or 'spectral')
     elif query.data == 'set_animation_firework':
         send_opengl(socket)
     elif 'stop_watch' in query.data:
@@ -322,31 +358,36 @@ def callback(update, context):
 
 @restricted
 def video(update, context):
-    video_cache_file_raw = config.telegram_video_folder / f'new_raw.mp4'
-    video_cache_file = config.telegram_video_folder / f'new.mp4'
+    attachment = update.message.effective_attachment
+    # The message id keeps two downloads of the same video apart until the player converted them
+    video_cache_file_raw = config.telegram_video_folder / f'{attachment.file_unique_id}_{update.message.message_id}_raw.mp4'
+    video_cache_file = config.telegram_video_folder / f'{attachment.file_unique_id}.rgb'
     reply_massage = context.bot.send_message(chat_id=update.effective_chat.id,
-                                             text=f"A video! Start Downloading ({update.message.effective_attachment.file_size/1024:.1f} kB)...")
-    raw_video_file = context.bot.get_file(update.message.effective_attachment.file_id)
+                                             text=f"A video! Start Downloading ({attachment.file_size/1024:.1f} kB)...")
+    raw_video_file = context.bot.get_file(attachment.file_id)
     raw_video_file.download(video_cache_file_raw)
-    prepare_video(video_cache_file_raw, video_cache_file)
-    send_cache_file(socket, video_cache_file, file_type='video')
-    reply_massage.edit_text(text=f"The video️ is now on display.")
+    # Converted by the player while the current animation keeps running
+    send_cache_file(socket, video_cache_file, file_type='video', raw_file=video_cache_file_raw)
+    reply_massage.edit_text(text=f"The video️ is on its way to the display.")
 
 
 @restricted
 def sticker(update, context):
 
-    sticker_cache_file = config.telegram_sticker_folder / f'{update.message.sticker.file_unique_id}.npz'
+    sticker_cache_file = frame_cache_file(config.telegram_sticker_folder / f'{update.message.sticker.file_unique_id}.npy')
 
     if update.message.sticker.is_animated:
         reply_massage = context.bot.send_message(chat_id=update.effective_chat.id,
                                                  text=f"An animated {update.message.sticker.emoji} sticker!")
+        tgs_file = None
         if not sticker_cache_file.is_file():
             reply_massage.edit_text(text=f"This animated {update.message.sticker.emoji} sticker from *{update.message.sticker.set_name.replace('_', ' ').upper()}* is a new one. Let me work on it!", parse_mode=ParseMode.MARKDOWN)
+            # Named per message like the videos, so a superseded download can be removed on its own
+            tgs_file = sticker_cache_file.with_name(f'{sticker_cache_file.stem}_{update.message.message_id}.tgs')
             raw_sticker_file = context.bot.get_file(update.message.sticker.file_id)
-            raw_sticker_file.download(sticker_cache_file.with_suffix('.tgs'))
-            prepare_animation(sticker_cache_file.with_suffix('.tgs'))
-        send_cache_file(socket, sticker_cache_file, file_type='sticker')
+            raw_sticker_file.download(tgs_file)
+        # A new sticker is announced right after the download, the player renders the .tgs
+        send_cache_file(socket, sticker_cache_file, file_type='sticker', raw_file=tgs_file)
 
     else:
         reply_massage = context.bot.send_message(chat_id=update.effective_chat.id, text=f"A {update.message.sticker.emoji} sticker!")
@@ -381,7 +422,7 @@ def cb_emoji(update, context):
     emoji_code = "_".join([f'{ord(c):x}' for c in emoji_value]).replace('_fe0f', '')
     reply_massage = context.bot.send_message(chat_id=update.effective_chat.id,
                                              text=f"An emoji! (U+{emoji_code})")
-    animated_emoji_file = config.telegram_sticker_folder / f'emoji_u{emoji_code}.npz'
+    animated_emoji_file = frame_cache_file(config.telegram_sticker_folder / f'emoji_u{emoji_code}.npy')
     if animated_emoji_file.is_file():
         send_cache_file(socket, animated_emoji_file, file_type='sticker')
         reply_massage.edit_text(text=f"{emoji_value} (U+{emoji_code}) is now animated on display.")
@@ -405,6 +446,7 @@ handler_list = [
     CommandHandler('clock', clock),
     CommandHandler('apple', apple_lamp),
     CommandHandler('admin', admin),
+    CommandHandler('playlist', playlist),
     CommandHandler('qr', qr),
     MessageHandler(Filters.sticker, sticker),
     MessageHandler(Filters.document.gif | Filters.video, video),
@@ -1,106 +1,191 @@
 import colorsys
+from functools import lru_cache
+import hashlib
 import math
 import time
-from multiprocessing import Process, Queue
+from multiprocessing import Process
 from pathlib import Path
-from queue import Empty as qu_Empty
-from threading import Thread
+from queue import Queue
+from threading import Event, Lock, Thread
 import random
-import moderngl
 import numpy as np
-import sounddevice as sd
-import zmq
-from matplotlib import cm
 from pyhap import const
 from pyhap.accessory import Accessory
 from pyhap.accessory_driver import AccessoryDriver
 
-from animation_helper.animation_functions import load_video, load_animation, load_text, load_qr
+from animation_helper.animation_functions import load_video, load_animation, load_text, load_qr, frame_cache_file
+from animation_helper.animation_functions import cache_animation, prepare_video, discard_download, remove_file
 from animation_helper.animation_functions import get_time_quad, get_stop_watch, get_weather_clock
-from animation_helper.render_earth import render_earth, render_single_frame
-from animation_helper.weather import get_weather_data
+from animation_helper.animation_cache import AnimationCache
+from animation_helper.audio_analysis import BandAnalyzer
+from animation_helper.audio_source import audio_source
+from animation_helper.compositor import FrameCompositor
+from animation_helper.palette import hue_palette
+from animation_helper.particles import ParticleSystem
+from animation_helper.render_earth import render_earth, render_single_frame, EarthAnimation, earth_bases
+from animation_helper.visualizers import visualizers
+from animation_helper.weather import weather_service, release_weather_service
+from control_plane import ControlServer, CommandQueue
+from playlist import AnimationSource, PlayerSource, PlaylistItem, Scheduler
 from post_master import LEDPost
+from shared_frames import SharedFrameStore
 import config
 
+try:
+    import moderngl
+except ImportError:
+    moderngl = None
+
 
 class LPlayer:
     def __init__(self):
 
         self.LEDmatrix = LEDPost(fps=30)
 
-        context = zmq.Context()
-        self.control_socket = context.socket(zmq.REP)
-        self.control_socket.bind("tcp://127.0.0.1:2222")
+        self.control = ControlServer("tcp://127.0.0.1:2222")
+        self.commands = CommandQueue(self.load, workers=config.control_workers, discard=discard_download)
+        self.staging_lock = Lock()
 
         self.mode = 'telegram'
+        self.animation_cache = AnimationCache(max_bytes=config.animation_cache_size,
+                                              usage_file=config.animation_usage_file,
+                                              save_every=config.animation_usage_save_every)
 
-        startup_annimation = config.telegram_sticker_folder / 'AgADMQADwZxgDA.npz'
+        startup_annimation = frame_cache_file(config.telegram_sticker_folder / 'AgADMQADwZxgDA.npy')
         if startup_annimation.is_file():
-            self.current_animation = load_animation(startup_annimation)
+            self.current_animation = self.animation_cache.get(startup_annimation, load_animation, count=False)
             self.current_player = Player(self.LEDmatrix, self.current_animation)
             self.current_player.start()
         else:
             self.current_animation = None
             self.current_player = None
+        Thread(target=self.animation_cache.prewarm, args=(load_animation, ),
+               kwargs={'most_used': config.animation_prewarm}, daemon=True).start()
 
-    def recv_work(self, copy=True, track=False):
-        meta_data = self.control_socket.recv_json()
-        print(meta_data)
+    def load(self, meta_data, payload=None):
+        """Turns a control command into the animation to show, runs on the command workers."""
         if meta_data['type'] == 'cache':
             if meta_data['file_type'] == 'video':
-                self.current_animation = load_video(Path(meta_data['cache']))
+                animation = self.stage_video(Path(meta_data['cache']), meta_data.get('raw'))
             elif meta_data['file_type'] == 'sticker':
-                self.current_animation = load_animation(Path(meta_data['cache']))
+                sticker_file = Path(meta_data['cache'])
+                if not sticker_file.is_file():
+                    self.stage_sticker(sticker_file, meta_data.get('raw'))
+                animation = self.animation_cache.get(sticker_file, load_animation)
+            else:
+                raise ValueError(f"unknown file type {meta_data['file_type']}")
+            return animation
         elif meta_data['type'] == 'music':
-            self.current_animation = {'music': True, 'fps': 60, 'name': meta_data['name']}
+            return {'music': True, 'fps': 60, 'name': meta_data['name'], 'source': meta_data.get('source')}
         elif meta_data['type'] == 'opengl':
-            self.current_animation = {'opengl': True, 'fps': 120}
+            return {'opengl': True, 'fps': 120}
         elif meta_data['type'] == 'apple':
-            self.current_animation = {'apple': True, 'command': meta_data['command']}
+            return {'apple': True, 'command': meta_data['command']}
         elif meta_data['type'] == 'animation_data':
-            msg = self.control_socket.recv(copy=copy, track=track)
-            buf = memoryview(msg)
-            animation_data_raw = np.frombuffer(buf, dtype=meta_data['dtype'])
+            animation_data_raw = np.frombuffer(memoryview(payload), dtype=meta_data['dtype'])
             animation_data_raw = animation_data_raw.reshape(meta_data['shape'])
-            self.current_animation = {'animation': True, 'fps': 5, 'frames': animation_data_raw}
+            return {'animation': True, 'fps': 5, 'frames': animation_data_raw}
         elif meta_data['type'] == 'text':
-            self.current_animation = load_text(meta_data['text'])
+            return load_text(meta_data['text'])
         elif meta_data['type'] == 'qr':
-            self.current_animation = load_qr(meta_data['data'])
+            return load_qr(meta_data['data'])
         elif meta_data['type'] == 'clock':
-            self.current_animation = {'clock': True, 'mode': meta_data['mode'], 'task': meta_data['task']}
+            return {'clock': True, 'mode': meta_data['mode'], 'task': meta_data['task']}
+        elif meta_data['type'] == 'playlist':
+            items = [PlaylistItem(item['command'], item.get('duration', config.playlist_duration),
+                                  item.get('priority', 0)) for item in meta_data.get('items', [])]
+            return {'playlist': True, 'items': items, 'loop': meta_data.get('loop', True),
+                    'crossfade': meta_data.get('crossfade', config.playlist_crossfade)}
         elif meta_data['type'] == 'settings':
             self.mode = meta_data['mode']
-        self.control_socket.send_string('received')
-        return True
+            return None
+        raise ValueError(f"unknown command {meta_data['type']}")
+
+    def stage_sticker(self, sticker_file, raw_file=None):
+        # New stickers arrive as the downloaded .tgs and are converted here, not in the bot
+        if raw_file is None:
+            return
+        with self.staging_lock:
+            try:
+                if not sticker_file.is_file() and Path(raw_file).is_file():
+                    cache_animation(Path(raw_file), sticker_file)
+            finally:
+                remove_file(raw_file)
+
+    def stage_video(self, video_file, raw_file=None):
+        with self.staging_lock:
+            if raw_file is not None and Path(raw_file).is_file():
+                try:
+                    if not video_file.is_file():
+                        prepare_video(Path(raw_file), video_file)
+                finally:
+                    remove_file(raw_file)
+            return load_video(video_file)
+
+    @staticmethod
+    def player_class(animation):
+        if animation.get('music'):
+            return MusicPlayer
+        elif animation.get('opengl'):
+            return OpenGLPlayer
+        elif animation.get('apple'):
+            return AppleHomeKitPlayer
+        elif animation.get('clock'):
+            return ClockPlayer
+        return Player
+
+    def make_source(self, item):
+        """Loads a playlist item into a frame source for the scheduler, runs on its preroll worker."""
+        animation = item.animation if item.animation is not None else self.load(item.command)
+        if animation.get('animation') or animation.get('mover'):
+            return AnimationSource(animation)
+        return PlayerSource(lambda tap: self.player_class(animation)(tap, animation))
+
+    def show(self, animation):
+        if animation is None:
+            return
+        new_player = None
+        if animation.get('playlist'):
+            # An empty playlist only ends the scheduler, the next command plays as usual
+            if animation['items']:
+                new_player = Scheduler(self.LEDmatrix, self.make_source, animation['items'],
+                                       crossfade=animation['crossfade'], preroll=config.playlist_preroll,
+                                       loop=animation['loop'])
+            elif self.current_player is not None and self.current_player.pid == 'scheduler':
+                self.current_player.stop()
+                self.current_player.join()
+                self.current_player = None
+        elif self.current_player is not None and self.current_player.pid == 'scheduler':
+            # Commands interrupt the playlist for a while instead of ending it
+            self.current_player.interrupt(PlaylistItem(None, config.playlist_interrupt_duration,
+                                                       config.playlist_interrupt_priority, animation))
+            return
+        elif animation.get('clock') and self.current_player is not None \
+                and self.current_player.pid == 'clock_player' and self.current_player.mode == animation['mode']:
+            self.current_player.task = animation['task']
+        elif self.player_class(animation) is Player and self.current_player is not None \
+                and self.current_player.pid == 'base_player' and self.current_player.is_alive():
+            # Swapped in by the running player between two frames, no thread restart and no black frame
+            self.current_player.stage(animation)
+        else:
+            new_player = self.player_class(animation)(self.LEDmatrix, animation)
+        self.current_animation = animation
+
+        if new_player is not None:
+            if self.current_player:
+                self.current_player.stop()
+                self.current_player.join()
+            self.current_player = new_player
+            self.current_player.start()
 
     def run(self):
+        # Requests are acked on arrival, loads run on the command workers and
+        # only the newest finished one is shown
         while True:
-            self.recv_work()
-            new_player = None
-            if self.current_animation.get('music'):
-                new_player = MusicPlayer(self.LEDmatrix, self.current_animation)
-            elif self.current_animation.get('opengl'):
-                new_player = OpenGLPlayer(self.LEDmatrix, self.current_animation)
-            elif self.current_animation.get('apple'):
-                new_player = AppleHomeKitPlayer(self.LEDmatrix, self.current_animation)
-            elif self.current_animation.get('clock'):
-                if self.current_player.pid == 'clock_player':
-                    if self.current_player.mode == self.current_animation['mode']:
-                        self.current_player.task = self.current_animation['task']
-                    else:
-                        new_player = ClockPlayer(self.LEDmatrix, self.current_animation)
-                else:
-                    new_player = ClockPlayer(self.LEDmatrix, self.current_animation)
-            else:
-                new_player = Player(self.LEDmatrix, self.current_animation)
-
-            if new_player is not None:
-                if self.current_player:
-                    self.current_player.stop()
-                    self.current_player.join()
-                self.current_player = new_player
-                self.current_player.start()
+            for meta_data, payload in self.control.receive(timeout=config.control_poll_ms):
+                print(meta_data)
+                self.commands.put(meta_data, payload)
+            self.commands.apply(self.show)
 
 
 class Player(Thread):
@@ -108,32 +193,51 @@ class Player(Thread):
 
     def __init__(self, led_matrix, current_animation):
         self.current_animation = current_animation
+        self.staged_animation = None
+        self.stage_lock = Lock()
         self.led_matrix = led_matrix
         self.stopped = False
         self.width = 64
         super().__init__()
 
+    def stage(self, animation):
+        """Hands over the next animation, it replaces the current one at the next frame boundary."""
+        with self.stage_lock:
+            self.staged_animation = animation
+
+    def fps(self, animation):
+        if animation.get('mover') and animation['frame'].shape[1] == self.width:
+            return 5
+        return animation['fps']
+
+    def frames(self, animation):
+        # One pass, run() repeats it until stopped or an animation is staged
+        if animation.get('animation'):
+            return animation['frames']
+        elif animation.get('mover'):
+            frame = animation['frame']
+            if frame.shape[1] == self.width:
+                return [frame]
+            return (frame[:, n:n+self.width] for n in range(frame.shape[1]-self.width))
+        return []
+
     def run(self):
-        self.led_matrix.fps = self.current_animation['fps']
-        if self.current_animation.get('animation'):
-            while not self.stopped:
-                for frame in self.current_animation['frames']:
-                    if not self.stopped:
-                        self.led_matrix.send(frame)
-                    else:
-                        break
-        elif self.current_animation.get('mover'):
-            if self.current_animation['frame'].shape[1] == self.width:
-                self.led_matrix.fps = 5
-                while not self.stopped:
-                    self.led_matrix.send(self.current_animation['frame'])
-            else:
-                while not self.stopped:
-                    for n in range(self.current_animation['frame'].shape[1]-self.width):
-                        if not self.stopped:
-                            self.led_matrix.send(self.current_animation['frame'][:, n:n+self.width])
-                        else:
-                            break
+        self.led_matrix.fps = self.fps(self.current_animation)
+        while not self.stopped:
+            sent = False
+            for frame in self.frames(self.current_animation):
+                if self.stopped or self.staged_animation is not None:
+                    break
+                self.led_matrix.send(frame)
+                sent = True
+            with self.stage_lock:
+                staged, self.staged_animation = self.staged_animation, None
+            if staged is not None:
+                self.current_animation = staged
+                self.led_matrix.fps = self.fps(staged)
+            elif not sent:
+                # Nothing to play, do not spin until something is staged
+                time.sleep(0.05)
 
     def stop(self):
         self.stopped = True
@@ -148,15 +252,26 @@ class ClockPlayer(Thread):
         self.task = current_animation['task']
         self.stopped = False
         self.led_matrix = led_matrix
+        self.compositor = FrameCompositor()
+        self.colors = hue_palette(saturation=1, value=0.6)
         if self.mode == 'world':
             self.led_matrix.fps = 30
             self.rotation_per_minute = 5
-            self.earth_queue = Queue(1)
             self.resolution_rotation = 360
             self.rot_frames = self.led_matrix.fps * 60 / self.rotation_per_minute
-            self.earth_process = Process(target=render_earth, args=(self.earth_queue, ), kwargs={'num': self.resolution_rotation})
-            self.earth_process.start()
-            self.earth = render_single_frame(0, 52)[None, ...]
+            self.earth_process = None
+            self.earth_lock = Lock()
+            base = earth_bases.load(config.earth_size)
+            if base is not None:
+                # Shaded lazily in this thread, only when the terminator moves by a pixel
+                self.earth = EarthAnimation(base, num=self.resolution_rotation)
+            else:
+                # matplotlib renders the earth until the base texture is built
+                self.earth_build = earth_bases.request(config.earth_size)
+                self.earth_frames = SharedFrameStore((self.resolution_rotation, config.earth_size, config.earth_size, 3))
+                self.earth_process = Process(target=render_earth, args=(self.earth_frames, config.earth_size))
+                self.earth_process.start()
+                self.earth = render_single_frame(0, config.earth_size)[None, ...]
         elif self.mode == 'stop':
             self.led_matrix.fps = 120
             pass
@@ -166,30 +281,46 @@ class ClockPlayer(Thread):
         while not self.stopped:
             n = (n + 1) % self.rot_frames
             frame = int(n / self.rot_frames * len(self.earth))
-            try:
-                self.earth = self.earth_queue.get(False)
-            except qu_Empty:
-                pass
-            self.led_matrix.send(get_time_quad(self.earth, earth_frame=frame))
+            if self.earth_process is not None:
+                self.update_earth()
+            self.led_matrix.send(get_time_quad(self.earth, earth_frame=frame, compositor=self.compositor))
+
+    def update_earth(self):
+        if self.earth_build is not None and not self.earth_build.is_alive():
+            self.earth_build = None
+            base = earth_bases.load(config.earth_size)
+            if base is not None:
+                self.stop_earth_process()
+                self.earth = EarthAnimation(base, num=self.resolution_rotation)
+                return
+        if self.earth is not self.earth_frames and self.earth_frames.generation:
+            self.earth = self.earth_frames
+
+    def stop_earth_process(self):
+        # Called by the world thread when the build is done and by stop(), only one gets the process
+        with self.earth_lock:
+            process, self.earth_process = self.earth_process, None
+        if process is not None:
+            process.kill()
+            self.earth_frames.unlink()
 
     def weather(self):
-        weather_icon, temp = get_weather_data(size=52)
-        start = time.time()
-        while not self.stopped:
-            if (time.time() - start) > 600:
-                weather_icon, temp = get_weather_data(size=52)
-                start = time.time()
-            hue = ((time.time()*10) % 600) / 600
-            rgb_tuple = colorsys.hsv_to_rgb(hue, 1, 0.6)
-            self.led_matrix.send(get_weather_clock(weather_icon, temp, rgb=rgb_tuple))
+        service = weather_service(size=52)
+        try:
+            while not self.stopped:
+                snapshot = service.snapshot
+                rgb_tuple = self.colors.cycle(60)
+                self.led_matrix.send(get_weather_clock(snapshot.icon, snapshot.temp, rgb=rgb_tuple, compositor=self.compositor))
+        finally:
+            # The last weather clock to leave stops the OWM polling
+            release_weather_service(service)
 
     def stop_watch(self):
         running = False
         diff = 0
         start = None
         while not self.stopped:
-            hue = ((time.time()*10) % 600) / 600
-            rgb_tuple = colorsys.hsv_to_rgb(hue, 1, 0.6)
+            rgb_tuple = self.colors.cycle(60)
             if self.task == 'start':
                 if diff == 0:
                     start = time.time()
@@ -205,7 +336,7 @@ class ClockPlayer(Thread):
                 self.task = None
             if running:
                 diff = time.time() - start
-            self.led_matrix.send(get_stop_watch(diff, rgb=rgb_tuple))
+            self.led_matrix.send(get_stop_watch(diff, rgb=rgb_tuple, compositor=self.compositor))
 
     def run(self):
         if hasattr(self, self.mode):
@@ -214,7 +345,7 @@ class ClockPlayer(Thread):
     def stop(self):
         self.stopped = True
         if self.mode == 'world':
-            self.earth_process.kill()
+            self.stop_earth_process()
 
 
 class AppleHomeKitPlayer(Thread):
@@ -316,6 +447,113 @@ class AppleHomeKitPlayer(Thread):
             return [int(rgb * 255) for rgb in colorsys.hsv_to_rgb(h / 360.0, s / 100.0, v / 100.0)]
 
 
+class GLRenderContext:
+    """Long lived moderngl context shared by all GL effects.
+
+    The context is created once on its own worker thread, the player threads
+    come and go, so effects are executed there with ``run``, which blocks
+    until the effect returns. Programs are cached by a hash of their sources,
+    buffers and vertex arrays by name, and one framebuffer with its readback
+    buffers is reused, so switching effects allocates nothing on the GPU.
+
+    Effects render into a uint8 RGB texture with y flipped in the vertex
+    shader. ``read`` copies it into one of two pixel buffers without waiting
+    for the GPU and returns the frame finished one call earlier, so frame N
+    renders while frame N-1 is sent.
+    """
+
+    def __init__(self, size=(64, 64)):
+        self.size = size
+        self.jobs = Queue()
+        self.ready = Event()
+        self.error = None
+        Thread(target=self.work, daemon=True).start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    def work(self):
+        try:
+            self.ctx = moderngl.create_context(standalone=True, backend='egl')
+            self.fbo = self.ctx.framebuffer(color_attachments=[self.ctx.texture(self.size, 3, dtype='f1')])
+            self.frames = np.zeros((2, self.size[1], self.size[0], 3), dtype=np.uint8)
+            self.pixel_buffers = [self.ctx.buffer(reserve=self.frames[0].nbytes) for _ in range(2)]
+            self.current = 0
+            self.pending = False
+            self.programs = {}
+            self.buffers = {}
+            self.vertex_arrays = {}
+        except Exception as e:
+            self.error = e
+        self.ready.set()
+        if self.error is not None:
+            return
+        while True:
+            effect, done = self.jobs.get()
+            self.pending = False
+            try:
+                effect(self)
+            except Exception as e:
+                print(f'GL effect failed: {e}')
+            done.set()
+
+    def run(self, effect):
+        done = Event()
+        self.jobs.put((effect, done))
+        done.wait()
+
+    def program(self, vertex_shader, fragment_shader=None, varyings=()):
+        key = hashlib.sha1(repr((vertex_shader, fragment_shader, tuple(varyings))).encode()).hexdigest()
+        if key not in self.programs:
+            self.programs[key] = self.ctx.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader,
+                                                  varyings=varyings)
+        return self.programs[key]
+
+    def buffer(self, name, size):
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.size != size:
+            if buffer is not None:
+                # Vertex arrays may point at the old buffer, they are rebuilt on demand
+                buffer.release()
+                for vertex_array in self.vertex_arrays.values():
+                    vertex_array.release()
+                self.vertex_arrays.clear()
+            buffer = self.buffers[name] = self.ctx.buffer(reserve=size, dynamic=True)
+        return buffer
+
+    def vertex_array(self, name, program, content):
+        if name not in self.vertex_arrays:
+            self.vertex_arrays[name] = self.ctx.vertex_array(program, content)
+        return self.vertex_arrays[name]
+
+    def read(self):
+        self.fbo.read_into(self.pixel_buffers[self.current], components=3, dtype='f1')
+        self.current ^= 1
+        frame = self.frames[self.current]
+        if self.pending:
+            self.pixel_buffers[self.current].read_into(frame)
+        else:
+            frame[...] = 0
+        self.pending = True
+        return frame
+
+
+@lru_cache(maxsize=None)
+def gl_context():
+    return GLRenderContext()
+
+
+def gl_available():
+    if moderngl is None:
+        return False
+    try:
+        gl_context()
+    except Exception as e:
+        print(f'No GL context, using the NumPy renderer: {e}')
+        return False
+    return True
+
+
 class OpenGLPlayer(Thread):
     pid = 'ogl_player'
 
@@ -328,9 +566,16 @@ class OpenGLPlayer(Thread):
         self.current_animation = current_animation
         self.led_matrix = led_matrix
         self.stopped = False
-        self.draw = self.first_3d
+        backend = config.opengl_backend
+        if backend == 'auto':
+            backend = 'gl' if gl_available() else 'numpy'
+        if backend == 'gl':
+            self.draw = lambda: gl_context().run(self.first_3d)
+        else:
+            self.draw = self.firework
 
     def run(self):
+        self.led_matrix.fps = self.fps
         self.draw()
 
     @staticmethod
@@ -367,12 +612,10 @@ class OpenGLPlayer(Thread):
         # out = np.stack([[x]*size, [y]*size, [r]*size, [g]*size, [b]*size, x + (np.cos(a) * radius), y + (np.sin(a) * radius)])
         return out
 
-    def first_3d(self):
-        ctx = moderngl.create_context(standalone=True, backend='egl')
-        fbo = ctx.simple_framebuffer((64, 64), components=3, dtype='f4')
-        fbo.use()
+    def first_3d(self, gl):
+        gl.fbo.use()
 
-        prog = ctx.program(
+        prog = gl.program(
             vertex_shader='''
                         #version 330
 
@@ -381,7 +624,7 @@ class OpenGLPlayer(Thread):
                         out vec3 color;
                         
                         void main() {
-                            gl_Position = vec4(in_vert, 0.0, 1.0);
+                            gl_Position = vec4(in_vert.x, -in_vert.y, 0.0, 1.0);  // rows read back top first
                             color = in_color;
                         }
                     ''',
@@ -395,7 +638,7 @@ class OpenGLPlayer(Thread):
                     """,
         )
 
-        transform = ctx.program(
+        transform = gl.program(
             vertex_shader='''
                     #version 330
 
@@ -423,11 +666,12 @@ class OpenGLPlayer(Thread):
         #acc.value = (0.0, 0.0)
         acc.value = (0.0, -0.0008)
 
-        vbo1 = ctx.buffer(b''.join(self.particle() for i in range(1024)))
+        vbo1 = gl.buffer('particles', 1024 * 28)
+        vbo1.write(b''.join(self.particle() for i in range(1024)))
 
-        vao1 = ctx.simple_vertex_array(transform, vbo1, 'in_pos', 'in_color', 'in_prev' )
+        vao1 = gl.vertex_array('particles_transform', transform, [(vbo1, '2f 3f 2f', 'in_pos', 'in_color', 'in_prev')])
 
-        render_vao = ctx.vertex_array(prog, [
+        render_vao = gl.vertex_array('particles_render', prog, [
              (vbo1, '2f 3f 2x4', 'in_vert', 'in_color'),
          ])
 
@@ -444,8 +688,8 @@ class OpenGLPlayer(Thread):
             # magnitude *= 10
             # buffer += magnitude[1:-2]
             # maxi = np.sum(np.abs(np.nan_to_num(recording)))
-            ctx.clear(0.0, 0.0, 0.0)
-            ctx.point_size = 1
+            gl.ctx.clear(0.0, 0.0, 0.0)
+            gl.ctx.point_size = 1
             if np.random.random() > 0.95:
             #print(buffer)
             # if np.any(buffer>0.1):
@@ -470,24 +714,28 @@ class OpenGLPlayer(Thread):
 
             render_vao.render(moderngl.POINTS, 1024)
             vao1.transform(vbo1, moderngl.POINTS, 1024)
-            image = np.frombuffer(fbo.read(components=3, dtype='f4'), dtype='f4') * 255.0
-            image = image.astype(np.uint8)
-            image = np.flip(image.reshape((64, 64, 3)), axis=0)
-            self.rec_time = self.led_matrix.send(image)
+            self.rec_time = self.led_matrix.send(gl.read())
 
 
 
-    def color_breath(self):
-        ctx = moderngl.create_context(standalone=True, backend='egl')
-        fbo = ctx.simple_framebuffer((64, 64), components=3, dtype='f4')
-        fbo.use()
-        prog = ctx.program(vertex_shader="""
+    def firework(self):
+        particles = ParticleSystem(1024)
+        while not self.stopped:
+            if np.random.random() > 0.95:
+                x, y = np.random.uniform(-1, 1, size=2)
+                particles.burst(np.random.randint(50, 300), x, y, color=np.random.uniform(0.2, 1, size=3))
+            self.led_matrix.send(particles.render())
+            particles.step()
+
+    def color_breath(self, gl):
+        gl.fbo.use()
+        prog = gl.program(vertex_shader="""
         #version 330
         in vec2 in_vert;
         in vec3 in_color;
         out vec3 color;
         void main() {
-            gl_Position = vec4(in_vert, 0.0, 1.0);
+            gl_Position = vec4(in_vert.x, -in_vert.y, 0.0, 1.0);  // rows read back top first
             color = in_color;
         }
         """,
@@ -501,6 +749,8 @@ class OpenGLPlayer(Thread):
         """,
                            )
 
+        vbo = gl.buffer('breath', 6 * 5 * 4)
+        vao = gl.vertex_array('breath', prog, [(vbo, '2f 3f', 'in_vert', 'in_color')])
         blue = 0
         while not self.stopped:
             blue = (blue + 1) % 200
@@ -517,16 +767,9 @@ class OpenGLPlayer(Thread):
                 dtype='f4',
             )
 
-            vao = ctx.simple_vertex_array(prog, ctx.buffer(vertices), 'in_vert', 'in_color')
+            vbo.write(vertices)
             vao.render(mode=moderngl.TRIANGLES)
-
-            image = np.frombuffer(fbo.read(components=3, dtype='f4'), dtype='f4') * 255.0
-            image = image.astype(np.uint8)
-            # print(image)
-            # print(image.shape)
-            # image.reshape((64,64,3))
-            image = np.flip(image.reshape((64, 64, 3)), axis=0)
-            self.led_matrix.send(image)
+            self.led_matrix.send(gl.read())
 
     def stop(self):
         self.stopped = True
@@ -535,74 +778,61 @@ class OpenGLPlayer(Thread):
 class MusicPlayer(Thread):
     pid = 'music_player'
 
-    def __init__(self, led_matrix, current_animation, device='cap', color_map='inferno', gain=50, width=64, height=64):
+    def __init__(self, led_matrix, current_animation, device=config.audio_device, color_map='inferno', gain=50,
+                 width=64, height=64):
         self.current_animation = current_animation
         self.led_matrix = led_matrix
-        self.device = device
-        self.samplerate = sd.query_devices(self.device, 'input')['default_samplerate']
         self.block_duration = 1000 / math.ceil(current_animation['fps'])  # ms
-        print(self.block_duration)
-        print(self.samplerate)
-        print(int(self.samplerate * self.block_duration / 1000))
-        self.stopped = False
+        self.device = device
         self.gain = gain
+        self.stopped = False
         self.width, self.height = width, height
-        self.color_canvas = np.zeros((width,height,3), dtype=np.uint8)
-        self.pos = 0
-        self.color_map = cm.get_cmap(color_map)
+        self.visualizer = None
+        if current_animation['name'] in visualizers:
+            self.visualizer = visualizers[current_animation['name']](width, height, color_map=color_map)
+        self.source = None
+        self.analyzer = None
         super().__init__()
 
-    def colorize_matrix(self, m, limit=1):
-        c = self.color_map((m+limit)/(limit*2))[:,:,:3]*255
-        return c
-
-    def colorize_line(self, l, limit=1):
-        l[l>1] = 1
-        c = self.color_map(l/limit)[:,:3]*255
-        return c
-
-    def spectral(self, indata, frames, time, status):
-        low = 100
-        high = 2000
-        width = int(self.width / 2.0)
-        delta_f = (high - low) / (width - 1)
-
-        fftsize = math.ceil(self.samplerate / delta_f)
-        low_bin = math.floor(low / delta_f)
-        if any(indata):
-            magnitude = np.abs(np.fft.rfft(indata[:, 0], n=fftsize))
-            magnitude *= self.gain / fftsize
-            line = np.zeros(self.width)
-            magnitude = magnitude[low_bin:low_bin + width]
-            line[:int(self.width/2.0)] = np.flip(magnitude)
-            line[int(self.width / 2.0):] = magnitude
-            self.line = line
-            self.color_canvas = np.roll(self.color_canvas, 1, axis=0)
-            self.color_canvas[0] = self.colorize_line(line)
-            self.led_matrix.send_non_blocking(self.color_canvas)
-        else:
-            print('no input')
+    def open_source(self):
+        # The source name comes from the client, it is opened here and not in the control loop
+        names = [self.current_animation.get('source'), self.device]
+        for name in dict.fromkeys(name for name in names if name):
+            try:
+                return audio_source(name, self.block_duration, folder=config.audio_folder,
+                                    devices=config.audio_devices)
+            except Exception as e:
+                print(f'Audio source {name!r} failed: {e!r}')
+        return None
+
+    def process_block(self, samples):
+        self.visualizer.push(self.analyzer.analyze(samples))
 
     def run(self):
-        self.line = 0
         self.led_matrix.fps = self.current_animation['fps']
+        if self.visualizer is None:
+            return
+        self.source = self.open_source()
+        if self.source is None:
+            print('No audio source, the music visualizer is not started')
+            return
+        print(f'{self.source.samplerate} Hz, {self.source.blocksize} samples per block')
+        self.analyzer = BandAnalyzer(self.source.samplerate, self.source.blocksize,
+                                     bands=int(self.width / 2.0), low=100, high=2000, gain=self.gain)
         try:
-            callback = getattr(self, self.current_animation['name'])
-        except AttributeError:
+            self.source.start(self.process_block)
+        except Exception as e:
+            print(f'Audio source could not be started: {e!r}')
             return
-        with sd.InputStream(device=self.device, channels=1, callback=callback,
-                            blocksize=int(self.samplerate * self.block_duration / 1000),
-                            samplerate=self.samplerate):
-            while True:
+        try:
+            while not self.stopped:
                 try:
-                    self.color_canvas = np.roll(self.color_canvas, 1, axis=0)
-                    self.color_canvas[0] = self.colorize_line(self.line)
-                    self.led_matrix.send(self.color_canvas)
+                    self.led_matrix.send(self.visualizer.frame())
                 except Exception as e:
                     print(e)
                     time.sleep(0.1)
-                if self.stopped:
-                    break
+        finally:
+            self.source.stop()
 
     def stop(self):
         self.stopped = True
@@ -0,0 +1,15 @@
+import config
+from animation_helper.animation_functions import migrate_frame_cache
+from animation_helper.render_earth import earth_bases
+
+print('Migrate sticker cache to memory mappable frames')
+legacy_files = sorted(config.telegram_sticker_folder.glob('*.npz'))
+for n, legacy_file in enumerate(legacy_files):
+    cache_file = migrate_frame_cache(legacy_file)
+    print(f'  [{n + 1}/{len(legacy_files)}] {legacy_file.name} -> {cache_file.name}')
+print(f'Migrated {len(legacy_files)} animations')
+
+legacy_base = config.cache_folder / 'world_base.npz'
+if legacy_base.is_file():
+    print('Migrate the earth base texture')
+    earth_bases.migrate(legacy_base, 'wb_360_52', 52)
@@ -0,0 +1,262 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+from itertools import count
+from threading import Lock, Thread
+import time
+
+import numpy as np
+
+from post_master import FramePacer
+
+# ``command`` is a control command as the bot sends it, ``animation`` an already loaded one.
+# Higher ``priority`` interrupts lower ones, ``duration`` is in seconds.
+PlaylistItem = namedtuple('PlaylistItem', ['command', 'duration', 'priority', 'animation'],
+                          defaults=(30.0, 0, None))
+
+
+def blend(a, b, alpha, out, scratch):
+    """``out = (1 - alpha) * a + alpha * b`` in 8 bit fixed point, ``scratch`` is a (2, ...) uint16 buffer."""
+    weight = int(round(alpha * 256))
+    np.multiply(a, 256 - weight, out=scratch[0], dtype=np.uint16)
+    np.multiply(b, weight, out=scratch[1], dtype=np.uint16)
+    scratch[0] += scratch[1]
+    np.right_shift(scratch[0], 8, out=scratch[0])
+    np.copyto(out, scratch[0], casting='unsafe')
+    return out
+
+
+class AnimationSource:
+    """Frames of a loaded sticker, video, text or QR animation, picked by time.
+
+    Nothing runs in the background, ``frame(now)`` advances the frame
+    iterator at the animation fps, so the output can run at any rate.
+    """
+
+    def __init__(self, animation, width=64):
+        self.animation = animation
+        self.width = width
+        self.fps = animation['fps']
+        if animation.get('mover') and animation['frame'].shape[1] == width:
+            self.fps = 5
+        self.frames = None
+        self.current = None
+        self.next_time = None
+
+    def pass_frames(self):
+        if self.animation.get('animation'):
+            return iter(self.animation['frames'])
+        frame = self.animation['frame']
+        if frame.shape[1] == self.width:
+            return iter([frame])
+        return (frame[:, n:n+self.width] for n in range(frame.shape[1]-self.width))
+
+    def advance(self):
+        for _ in range(2):
+            try:
+                return next(self.frames)
+            except StopIteration:
+                self.frames = self.pass_frames()
+        return self.current
+
+    def start(self):
+        self.frames = self.pass_frames()
+        self.current = self.advance()
+        self.next_time = None
+
+    def frame(self, now):
+        if self.next_time is None:
+            self.next_time = now + 1 / self.fps
+        # Late frames are skipped, a slow output never stretches the animation
+        while now >= self.next_time:
+            self.current = self.advance()
+            self.next_time += 1 / self.fps
+        return self.current
+
+    def stop(self):
+        self.frames = None
+
+
+class FrameTap:
+    """Stands in for the ``LEDPost`` of a player thread.
+
+    ``send`` keeps a copy of the frame in one of two buffers and paces the
+    player at its own fps. ``latest`` is the last complete frame, it stays
+    valid until the player sent two more.
+    """
+
+    def __init__(self, fps=30, width=64, height=64):
+        self.pacer = FramePacer(fps)
+        self.buffers = np.zeros((2, height, width, 3), dtype=np.uint8)
+        self.back = 0
+        self.latest = None
+
+    @property
+    def fps(self):
+        return self.pacer.fps
+
+    @fps.setter
+    def fps(self, fps):
+        self.pacer.fps = fps
+
+    def send(self, matrix):
+        np.copyto(self.buffers[self.back], matrix, casting='unsafe')
+        self.latest = self.buffers[self.back]
+        self.back ^= 1
+        self.pacer.wait()
+
+    def send_color(self, color):
+        self.buffers[self.back][...] = np.array(color)[None, None, :]
+        self.send(self.buffers[self.back])
+
+
+class PlayerSource:
+    """Runs one of the player threads (clock, GL, music, ...) into a ``FrameTap``."""
+
+    def __init__(self, make_player):
+        self.tap = FrameTap()
+        self.player = make_player(self.tap)
+
+    def start(self):
+        self.player.start()
+
+    def frame(self, now):
+        return self.tap.latest
+
+    def stop(self):
+        # No join, the output keeps running while the thread winds down
+        self.player.stop()
+
+
+class Scheduler(Thread):
+    """Plays a looping playlist on the LED matrix with crossfades.
+
+    The output loop never stops between items. ``make_source(item)`` loads
+    an item into a frame source, it runs on a worker ``preroll`` seconds
+    before the slot of the item, so the next frames are ready when the
+    slot starts. The last ``crossfade`` seconds of a slot blend into the next
+    item. ``interrupt`` queues an item by priority. One with at least the
+    priority of the playing item cuts its slot short, the playlist resumes
+    where it left off once the queue is empty. A source that failed to load
+    is skipped.
+    """
+
+    pid = 'scheduler'
+
+    def __init__(self, led_matrix, make_source, items=(), fps=30, crossfade=0.5, preroll=2.0, loop=True):
+        super().__init__()
+        self.led_matrix = led_matrix
+        self.make_source = make_source
+        self.items = list(items)
+        self.fps = fps
+        self.crossfade = crossfade
+        self.preroll = preroll
+        self.loop = loop
+        self.position = 0
+        self.interrupts = []
+        self.order = count()
+        self.lock = Lock()
+        self.loader = ThreadPoolExecutor(max_workers=1)
+        self.stopped = False
+        self.display = np.zeros((64, 64, 3), dtype=np.uint8)
+        self.scratch = np.zeros((2, 64, 64, 3), dtype=np.uint16)
+        self.black = np.zeros((64, 64, 3), dtype=np.uint8)
+        self.current = None
+        self.upcoming = None
+
+    def interrupt(self, item):
+        with self.lock:
+            heapq.heappush(self.interrupts, (-item.priority, next(self.order), item))
+
+    def next_item(self):
+        with self.lock:
+            if self.interrupts:
+                return heapq.heappop(self.interrupts)[2]
+            if not self.items or (self.position >= len(self.items) and not self.loop):
+                return None
+            item = self.items[self.position % len(self.items)]
+            self.position = (self.position + 1) % len(self.items) if self.loop else self.position + 1
+            return item
+
+    def preempts(self, item):
+        with self.lock:
+            return bool(self.interrupts) and -self.interrupts[0][0] >= item.priority
+
+    def prepare(self, item):
+        source = self.make_source(item)
+        source.start()
+        return item, source
+
+    def schedule(self, playing=None):
+        item = self.next_item()
+        if item is None or item is playing:
+            return False
+        self.upcoming = self.loader.submit(self.prepare, item)
+        return True
+
+    def take_upcoming(self, now):
+        if self.upcoming is None or not self.upcoming.done():
+            return None
+        future, self.upcoming = self.upcoming, None
+        try:
+            item, source = future.result()
+        except Exception as e:
+            print(f'Playlist item failed: {e!r}')
+            return None
+        return item, source, now
+
+    def discard_upcoming(self):
+        if self.upcoming is not None and not self.upcoming.cancel():
+            self.upcoming.add_done_callback(lambda f: f.exception() is None and f.result()[1].stop())
+        self.upcoming = None
+
+    def render(self, now):
+        if self.current is None:
+            return self.black
+        frame = self.current[1].frame(now)
+        return self.black if frame is None else frame
+
+    def run(self):
+        self.led_matrix.fps = self.fps
+        fade = None
+        while not self.stopped:
+            now = time.perf_counter()
+            if self.current is None:
+                if self.upcoming is None:
+                    self.schedule()
+                self.current = self.take_upcoming(now)
+            elif fade is None:
+                item, source, start = self.current
+                end = start + item.duration
+                if self.preempts(item):
+                    # Cut the slot short, a queued interrupt replaces whatever was prerolled
+                    self.discard_upcoming()
+                    end = now + self.crossfade
+                    self.current = (item, source, end - item.duration)
+                if self.upcoming is None and now >= end - self.preroll - self.crossfade:
+                    if not self.schedule(playing=item):
+                        # Nothing else to play, the item gets another slot
+                        self.current = (item, source, now)
+                elif now >= end - self.crossfade:
+                    # Not ready yet means the current item plays on, the output never waits
+                    fade = self.take_upcoming(now)
+
+            frame = self.render(now)
+            if fade is not None:
+                alpha = min(1.0, (now - fade[2]) / self.crossfade) if self.crossfade > 0 else 1.0
+                next_frame = fade[1].frame(now)
+                frame = blend(frame, self.black if next_frame is None else next_frame, alpha,
+                              self.display, self.scratch)
+                if alpha >= 1.0:
+                    self.current[1].stop()
+                    self.current, fade = fade, None
+            self.led_matrix.send(frame)
+
+        for playing in [self.current, fade]:
+            if playing is not None:
+                playing[1].stop()
+        self.discard_upcoming()
+        self.loader.shutdown(wait=False)
+
+    def stop(self):
+        self.stopped = True
@@ -1,11 +1,90 @@
+from collections import deque
 import time
 
 import numpy as np
 import zmq
 
+from frame_codec import DELTA_CHANNEL, FrameEncoder
+
+
+class FramePacer:
+    """Paces frames against absolute deadlines on a monotonic clock.
+
+    Every ``wait`` sleeps until the next deadline on a fixed grid, so render
+    time and sleep overshoot do not add up. The last ``spin`` seconds are
+    busy-waited for sub-millisecond accuracy. When a frame is late by a full
+    interval or more, ``skip_frames`` keeps the grid and counts the missed
+    slots as dropped, otherwise the grid restarts at the current time. Pauses
+    longer than ``max_lag`` (e.g. a player switch) always restart the grid.
+    """
+
+    def __init__(self, fps=120, skip_frames=False, spin=0.0005, max_lag=0.25, history=240):
+        self.skip_frames = skip_frames
+        self.spin = spin
+        self.max_lag = max_lag
+        self.frame_times = deque(maxlen=history)
+        self.dropped = 0
+        self.frames = 0
+        self.deadline = None
+        self.fps = fps
+
+    @property
+    def fps(self):
+        return self._fps
+
+    @fps.setter
+    def fps(self, fps):
+        self._fps = fps
+        self.interval = 1.0 / fps
+        self.deadline = None
+        self.frame_times.clear()
+
+    def remaining(self):
+        if self.deadline is None:
+            return 0.0
+        return max(0.0, self.deadline - time.perf_counter())
+
+    def wait(self):
+        now = time.perf_counter()
+        if self.deadline is None:
+            self.deadline = now + self.interval
+        lag = now - self.deadline
+        if lag > self.max_lag:
+            self.deadline = now
+        elif lag >= self.interval:
+            missed = int(lag / self.interval)
+            if self.skip_frames:
+                self.deadline += missed * self.interval
+                self.dropped += missed
+            else:
+                self.deadline = now
+
+        sleep_time = self.deadline - self.spin - now
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+        while time.perf_counter() < self.deadline:
+            pass
+
+        self.frame_times.append(time.perf_counter())
+        self.frames += 1
+        self.deadline += self.interval
+        return self.deadline
+
+    def stats(self):
+        intervals = np.diff(self.frame_times) if len(self.frame_times) > 1 else np.zeros(1)
+        mean_interval = np.mean(intervals)
+        return dict(
+            fps=1.0 / mean_interval if mean_interval > 0 else 0.0,
+            target_fps=self.fps,
+            jitter=float(np.std(intervals)),
+            dropped=self.dropped,
+            frames=self.frames,
+        )
+
 
 class LEDPost:
-    def __init__(self, fps=120, width=64, height=64, address='tcp://127.0.0.1:5555', channel=b'A'):
+    def __init__(self, fps=120, width=64, height=64, address='tcp://127.0.0.1:5555', channel=b'A',
+                 skip_frames=False, raw=True, compress=False, keyframe_interval=60):
         self.context = zmq.Context()
 
         #  Socket to talk to server
@@ -14,17 +93,57 @@ class LEDPost:
         self.socket = self.context.socket(zmq.PUB)
         self.socket.connect(address)
         self.send_matrix = np.zeros((width, height, 3), dtype=np.uint8)
-        self.fps = fps
-        self.last_frame = time.time()
+        self.staging = np.zeros((width, height, 3), dtype=np.uint8)
+        self.staging_tracker = None
+        self.pacer = FramePacer(fps, skip_frames=skip_frames)
+        # The raw channel is what lamp_pusher reads, the delta channel is opt-in
+        self.raw = raw
+        self.encoder = FrameEncoder(keyframe_interval) if compress else None
+
+    @property
+    def fps(self):
+        return self.pacer.fps
+
+    @fps.setter
+    def fps(self, fps):
+        self.pacer.fps = fps
+
+    def stats(self):
+        return self.pacer.stats()
+
+    def pack(self, matrix):
+        if matrix.dtype == np.uint8 and matrix.flags.c_contiguous:
+            return matrix
+        if self.staging_tracker is not None:
+            self.staging_tracker.wait()
+            self.staging_tracker = None
+        if self.staging.shape != matrix.shape:
+            self.staging = np.zeros(matrix.shape, dtype=np.uint8)
+        np.copyto(self.staging, matrix, casting='unsafe')
+        return self.staging
+
+    def publish(self, matrix):
+        # Frames go out through the buffer protocol without a bytes object.
+        # Below copy_threshold zmq copies them straight into the message anyway,
+        # larger ones are sent in place, so callers must not modify those until
+        # zmq is done with them (the staging buffer waits on its tracker).
+        frame = self.pack(matrix)
+        if self.raw:
+            copy = frame.nbytes < self.socket.copy_threshold
+            track = not copy and frame is self.staging
+            tracker = self.socket.send_multipart([self.channel, frame], copy=copy, track=track)
+            if track:
+                self.staging_tracker = tracker
+        if self.encoder is not None:
+            self.socket.send_multipart([DELTA_CHANNEL] + self.encoder.encode(frame))
 
     def send(self, matrix):
-        self.socket.send_multipart([self.channel, matrix.tobytes(order='C')])
-        time.sleep(max(0.0, (1.0 / self.fps) - (time.time() - self.last_frame)))
-        self.last_frame = time.time()
+        self.publish(matrix)
+        self.pacer.wait()
 
     def send_non_blocking(self, matrix):
-        self.socket.send_multipart([self.channel, matrix.tobytes(order='C')])
-        return max(0.0, (1.0 / self.fps) - (time.time() - self.last_frame))
+        self.publish(matrix)
+        return self.pacer.remaining()
 
     def send_np_array(self, matrix):
         self.send(matrix.astype(np.uint8))
@@ -34,4 +153,4 @@ class LEDPost:
 
     def send_color(self, color):
         self.send_matrix[:,:] = np.array(color)[None,None,:]
-        self.send(self.send_matrix)
\ No newline at end of file
+        self.send(self.send_matrix)
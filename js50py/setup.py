@@ -1,10 +1,9 @@
 import config
 from animation_helper.sticker_pack_cache import StickerCollector
-from animation_helper.render_earth import render_single_frame
+from animation_helper.render_earth import earth_bases
 import subprocess
 import json
 import urllib.request
-import numpy as np
 import zipfile
 
 print('JS50 lamp setup')
@@ -69,11 +68,7 @@ if not (config.tgs_tool_folder / 'node_modules').is_dir():
 
 print('fill cache')
 print('earth base')
-if not (config.cache_folder / 'world_base.npz').is_file():
-    earth_animation = np.zeros((360, 52, 52, 3), dtype=np.uint8)
-    for n, w in enumerate(np.linspace(0, 360, 360, endpoint=False)):
-        earth_animation[n] = render_single_frame(w, 52, light=False)
-    np.savez(config.cache_folder / 'world_base.npz', wb_360_52=earth_animation)
+earth_bases.get(config.earth_size, wait=True)
 
 print('Collect default sticker')
 pyrogram_config = config.base_dir / 'js50py' / 'animation_helper' / 'pyrogram.ini'
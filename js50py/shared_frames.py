@@ -0,0 +1,77 @@
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedFrameStore:
+    """Double buffered frame stack in shared memory.
+
+    A producer process renders into the back buffer inside ``write`` and
+    publishes it by flipping the active buffer. Readers index the active
+    buffer in place, nothing is pickled or copied between the processes.
+    ``generation`` counts the published stacks. Every buffer also carries a
+    sequence number that is odd while it is written (a seqlock), ``read``
+    uses it to retry a copy that raced with the producer. Views returned by
+    indexing stay valid until the producer published twice more.
+
+    The store pickles by name, so it can be handed to spawned processes too.
+    """
+
+    header_bytes = 64
+
+    def __init__(self, shape, name=None, dtype=np.uint8):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None,
+                                              size=self.header_bytes + 2 * frame_bytes)
+        # generation, active buffer, sequence of buffer 0, sequence of buffer 1
+        self.header = np.ndarray((4, ), dtype=np.int32, buffer=self.shm.buf)
+        self.buffers = np.ndarray((2, ) + self.shape, dtype=self.dtype, buffer=self.shm.buf,
+                                  offset=self.header_bytes)
+        if name is None:
+            self.header[:] = 0
+
+    def __reduce__(self):
+        return self.__class__, (self.shape, self.shm.name, self.dtype)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def generation(self):
+        return int(self.header[0])
+
+    @contextmanager
+    def write(self):
+        back = 1 - int(self.header[1])
+        self.header[2 + back] += 1
+        try:
+            yield self.buffers[back]
+        finally:
+            self.header[2 + back] += 1
+        self.header[1] = back
+        self.header[0] += 1
+
+    def active(self):
+        return self.buffers[int(self.header[1])]
+
+    def __getitem__(self, n):
+        return self.active()[n]
+
+    def frame_key(self, n):
+        return id(self), self.generation, n
+
+    def read(self, n, out=None):
+        if out is None:
+            out = np.empty(self.shape[1:], dtype=self.dtype)
+        while True:
+            active = int(self.header[1])
+            sequence = int(self.header[2 + active])
+            out[...] = self.buffers[active, n]
+            if sequence % 2 == 0 and int(self.header[2 + active]) == sequence:
+                return out
+
+    def unlink(self):
+        self.shm.unlink()
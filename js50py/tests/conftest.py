@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The player modules import each other as top level modules from js50py
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
@@ -0,0 +1,32 @@
+import json
+
+import numpy as np
+
+from animation_helper.animation_cache import AnimationCache
+from animation_helper.animation_functions import load_frames, save_frames
+
+
+def load(path):
+    return {'animation': True, 'frames': load_frames(path), 'fps': 60}
+
+
+def test_memmap_frames_are_not_copied(tmp_path):
+    sticker = tmp_path / 'sticker.npy'
+    save_frames(sticker, np.zeros((600, 64, 64, 3), dtype=np.uint8))
+    cache = AnimationCache(max_bytes=16 * 1024 * 1024)
+    animation = cache.get(sticker, load)
+    assert isinstance(animation['frames'], np.memmap)
+    assert cache.get(sticker, load) is animation
+    assert cache.stats()['hits'] == 1
+
+
+def test_unreadable_usage_file(tmp_path):
+    usage_file = tmp_path / 'usage.json'
+    usage_file.write_text('{"a": 3, "b')
+    sticker = tmp_path / 'sticker.npy'
+    save_frames(sticker, np.zeros((2, 64, 64, 3), dtype=np.uint8))
+    cache = AnimationCache(usage_file=usage_file, save_every=2)
+    assert not cache.usage
+    cache.get(sticker, load)
+    cache.get(sticker, load)
+    assert json.loads(usage_file.read_text()) == {str(sticker): 2}
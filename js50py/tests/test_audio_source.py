@@ -0,0 +1,39 @@
+import time
+import wave
+
+import numpy as np
+import pytest
+
+from animation_helper.audio_source import FileSource, SyntheticSource, audio_source
+
+
+def write_wav(path, samples, samplerate=48000):
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(samplerate)
+        f.writeframes((np.asarray(samples) * 32767).astype(np.int16).tobytes())
+
+
+def test_audio_source_names(tmp_path):
+    folder = tmp_path / 'audio'
+    folder.mkdir()
+    write_wav(folder / 'song.wav', np.zeros(4800))
+    write_wav(tmp_path / 'outside.wav', np.zeros(4800))
+    assert isinstance(audio_source('chirp'), SyntheticSource)
+    assert isinstance(audio_source('song.wav', folder=folder), FileSource)
+    for name in ['/nope.wav', '../outside.wav', str(tmp_path / 'outside.wav'), 'missing.wav', 'speaker']:
+        with pytest.raises(ValueError):
+            audio_source(name, folder=folder)
+
+
+def test_short_wav_plays_and_stops(tmp_path):
+    write_wav(tmp_path / 'short.wav', np.zeros(480))
+    source = FileSource(tmp_path / 'short.wav')
+    assert len(source.samples) == source.blocksize
+    blocks = []
+    source.start(blocks.append)
+    time.sleep(0.1)
+    source.stop()
+    source.thread.join(1)
+    assert blocks and not source.thread.is_alive()
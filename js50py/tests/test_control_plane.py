@@ -0,0 +1,84 @@
+from threading import Event
+import time
+
+import zmq
+
+from animation_helper.animation_functions import discard_download
+from control_plane import CommandQueue, ControlServer, control_client
+
+
+def serve(server, commands, show, until, timeout=2.0):
+    deadline = time.time() + timeout
+    while not until() and time.time() < deadline:
+        for meta_data, payload in server.receive(timeout=20):
+            commands.put(meta_data, payload)
+        commands.apply(show)
+
+
+def test_failed_show_keeps_acking():
+    server = ControlServer('tcp://127.0.0.1:5597')
+    client = control_client('tcp://127.0.0.1:5597', timeout=1000)
+    commands = CommandQueue(lambda meta_data, payload: meta_data, workers=1)
+    shown = []
+
+    def show(meta_data):
+        if meta_data['source'] == '/nope.wav':
+            raise FileNotFoundError(meta_data['source'])
+        shown.append(meta_data)
+
+    client.send_json({'type': 'music', 'name': 'vu', 'source': '/nope.wav'})
+    serve(server, commands, show, until=lambda: False, timeout=0.3)
+    assert client.recv_string() == 'received'
+
+    client.send_json({'type': 'music', 'name': 'vu', 'source': 'chirp'})
+    serve(server, commands, show, until=lambda: shown)
+    assert client.recv_string() == 'received'
+    assert [meta_data['source'] for meta_data in shown] == ['chirp']
+    client.close(linger=0)
+    server.socket.close(linger=0)
+
+
+def test_failed_load_keeps_acking():
+    server = ControlServer('tcp://127.0.0.1:5596')
+    client = control_client('tcp://127.0.0.1:5596', timeout=1000)
+
+    def load(meta_data, payload):
+        if meta_data['type'] == 'qr':
+            raise ValueError('broken')
+        return meta_data
+
+    commands = CommandQueue(load, workers=1)
+    shown = []
+    for meta_data in [{'type': 'qr', 'data': 'x'}, {'type': 'text', 'text': 'js50'}]:
+        client.send_json(meta_data)
+        serve(server, commands, shown.append, until=lambda: shown, timeout=0.5)
+        assert client.recv_string() == 'received'
+    assert shown == [{'type': 'text', 'text': 'js50'}]
+    client.close(linger=0)
+    server.socket.close(linger=0)
+
+
+
+def test_superseded_downloads_are_removed(tmp_path):
+    started = Event()
+    release = Event()
+
+    def load(meta_data, payload):
+        started.set()
+        release.wait(1)
+        return meta_data
+
+    commands = CommandQueue(load, workers=1, discard=discard_download)
+    commands.put({'type': 'text', 'text': 'busy'})
+    started.wait(1)
+    downloads = []
+    for n, (file_type, suffix) in enumerate([('video', 'mp4'), ('sticker', 'tgs'), ('sticker', 'tgs')]):
+        raw = tmp_path / f'download_{n}.{suffix}'
+        raw.write_bytes(b'raw')
+        downloads.append(raw)
+        commands.put({'type': 'cache', 'file_type': file_type, 'cache': str(tmp_path / f'{n}.npy'), 'raw': str(raw)})
+    # The video and the first sticker are superseded while the worker is busy
+    assert [raw.is_file() for raw in downloads] == [False, False, True]
+    commands.put({'type': 'cancel'})
+    assert not downloads[2].is_file()
+    release.set()
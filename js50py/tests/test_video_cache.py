@@ -0,0 +1,31 @@
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from animation_helper.animation_functions import load_video, prepare_video
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='needs ffmpeg')
+
+
+@needs_ffmpeg
+def test_prepare_video_maps_frames(tmp_path):
+    raw = tmp_path / 'clip_raw.mp4'
+    subprocess.run(['ffmpeg', '-f', 'lavfi', '-i', 'testsrc=size=128x96:rate=10:duration=1', '-y', str(raw)],
+                   check=True, capture_output=True)
+    cache_file = tmp_path / 'clip.rgb'
+    prepare_video(raw, cache_file)
+    animation = load_video(cache_file)
+    assert isinstance(animation['frames'], np.memmap)
+    assert animation['frames'].shape == (10, 64, 64, 3) and animation['fps'] == 10
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['clip.json', 'clip.rgb']
+
+
+@needs_ffmpeg
+def test_prepare_video_cleans_up_on_failure(tmp_path):
+    raw = tmp_path / 'broken_raw.mp4'
+    raw.write_bytes(b'not a video')
+    with pytest.raises(Exception):
+        prepare_video(raw, tmp_path / 'broken.rgb')
+    assert list(tmp_path.iterdir()) == []